@@ -0,0 +1,56 @@
+# shared/dtc_index.py
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+# DTC values that mean "no fault code"
+NO_FAULT_CODES = {"", "OK", "NONE", "NULL"}
+
+
+def normalize_dtc_codes(codes: Optional[Iterable]) -> Tuple[str, ...]:
+    """Upper-cased, de-duplicated, sorted fault codes; 'OK'/None dropped."""
+    out = set()
+    for c in codes or ():
+        if c is None:
+            continue
+        code = str(c).strip().upper()
+        if code not in NO_FAULT_CODES:
+            out.add(code)
+    return tuple(sorted(out))
+
+
+class DTCIndex:
+    """Inverted index from DTC code to the CAPA documents that list it."""
+
+    def __init__(self, docs: List[Document]):
+        self.documents: Dict[str, Document] = {}
+        self._by_code: Dict[str, List[str]] = {}
+
+        for d in docs:
+            doc_id = d.metadata["id"]
+            self.documents[doc_id] = d
+            for code in normalize_dtc_codes(d.metadata.get("related_dtc_codes")):
+                self._by_code.setdefault(code, []).append(doc_id)
+
+    def candidates(self, codes: Iterable) -> List[str]:
+        """
+        Document ids related to any of the codes, best first: most codes
+        matched, then highest CAPA confidence.
+        """
+        matches: Dict[str, int] = {}
+        for code in normalize_dtc_codes(codes):
+            for doc_id in self._by_code.get(code, ()):
+                matches[doc_id] = matches.get(doc_id, 0) + 1
+
+        return sorted(
+            matches,
+            key=lambda i: (-matches[i], -float(self.documents[i].metadata.get("confidence", 0))),
+        )
+
+
+def get_dtc_index() -> DTCIndex:
+    """DTC index of the current CAPA library (rebuilt with it when the file changes)."""
+    from .retrieval import capa_library_dtc_index
+    return capa_library_dtc_index()
@@ -0,0 +1,133 @@
+# shared/executors.py
+#
+# Bounded executors for the agent services. Endpoints are async; blocking
+# work is handed to a named pool instead of Starlette's shared threadpool:
+#
+#   io        - file / SQLite reads, in-memory lookups (cheap)
+#   embedding - sentence-transformer queries, FAISS search / sync
+#   llm       - flan-t5 generation
+#   ml        - model fitting (IsolationForest)
+#
+# Each agent runs in its own process, so sizes are set per agent with
+# EXECUTOR_<NAME>_WORKERS and EXECUTOR_<NAME>_QUEUE (tasks allowed to wait
+# beyond the running ones). A full pool rejects new work with ExecutorBusy,
+# which install_busy_handler turns into HTTP 503 + Retry-After.
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+
+DEFAULT_WORKERS = {"io": 8, "embedding": 2, "llm": 1, "ml": 2}
+DEFAULT_QUEUE = {"io": 256, "embedding": 64, "llm": 8, "ml": 8}
+
+
+class ExecutorBusy(RuntimeError):
+    def __init__(self, name: str):
+        super().__init__(f"[executors] '{name}' pool is saturated; retry later")
+        self.name = name
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor that admits at most workers + queue tasks at once."""
+
+    def __init__(self, name: str, workers: int, queue: int):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._in_flight = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusy(self.name)
+        with self._lock:
+            self._in_flight += 1
+        future = self._pool.submit(partial(fn, *args, **kwargs))
+        # Released when the work finishes, even if the awaiting request is cancelled
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue": self.queue,
+            "in_flight": self._in_flight,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    return max(1, int(os.getenv(name, str(default))))
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    ex = _executors.get(name)
+    if ex is None:
+        with _lock:
+            ex = _executors.get(name)
+            if ex is None:
+                key = name.upper()
+                ex = _executors[name] = BoundedExecutor(
+                    name,
+                    _env_int(f"EXECUTOR_{key}_WORKERS", DEFAULT_WORKERS.get(name, 2)),
+                    _env_int(f"EXECUTOR_{key}_QUEUE", DEFAULT_QUEUE.get(name, 32)),
+                )
+    return ex
+
+
+async def run_in(name: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking callable on the named bounded pool and await the result."""
+    return await get_executor(name).run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    return await run_in("io", fn, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: ex.stats() for name, ex in list(_executors.items())}
+
+
+def shutdown_executors():
+    with _lock:
+        for ex in _executors.values():
+            ex.shutdown()
+        _executors.clear()
+
+
+def install_busy_handler(app, retry_after: int = 1):
+    """Map ExecutorBusy to 503 with Retry-After on a FastAPI app."""
+    from fastapi.responses import JSONResponse
+
+    async def _busy(request, exc: ExecutorBusy):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(exc), "pool": exc.name},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    app.add_exception_handler(ExecutorBusy, _busy)
@@ -0,0 +1,90 @@
+# shared/fleet_store.py
+
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# ---------- Base path helpers ----------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))        # /shared
+DATA_DIR = os.path.join(BASE_DIR, "..", "data")              # /data
+
+
+IndexBuilder = Callable[[List[Dict[str, Any]]], Dict[str, Any]]
+
+
+class IndexedDataset:
+    """
+    One JSON data file, parsed once and held as a dict index.
+    The file is re-parsed only when its mtime or size changes.
+    """
+
+    def __init__(self, filename: str, build_index: IndexBuilder):
+        self.filename = filename
+        self.path = os.path.join(DATA_DIR, filename)
+        self._build_index = build_index
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._index: Dict[str, Any] = {}
+        self.version = 0
+
+    def _stat(self) -> Tuple[int, int]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"[fleet_store] JSON file not found: {self.path}")
+        return st.st_mtime_ns, st.st_size
+
+    def index(self) -> Dict[str, Any]:
+        signature = self._stat()
+        if signature == self._signature:
+            return self._index
+
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            if signature != self._signature:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                records = data if isinstance(data, list) else [data]
+
+                self._index = self._build_index(records)
+                self._signature = signature
+                self.version += 1
+
+        return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+
+class FleetStore:
+    """Process-wide registry of indexed data files (one per filename)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datasets: Dict[str, IndexedDataset] = {}
+
+    def dataset(self, filename: str, build_index: IndexBuilder) -> IndexedDataset:
+        ds = self._datasets.get(filename)
+        if ds is None:
+            with self._lock:
+                ds = self._datasets.setdefault(filename, IndexedDataset(filename, build_index))
+        return ds
+
+    def invalidate(self):
+        for ds in list(self._datasets.values()):
+            ds.invalidate()
+
+
+_fleet_store = None
+
+
+def get_fleet_store() -> FleetStore:
+    global _fleet_store
+
+    if _fleet_store is None:
+        _fleet_store = FleetStore()
+
+    return _fleet_store
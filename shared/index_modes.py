@@ -0,0 +1,304 @@
+# shared/index_modes.py
+#
+# FAISS index modes for the CAPA vectorstore (CAPA_INDEX_MODE):
+#   flat  - exact float32 IndexFlatL2 (default; memory-mapped when persisted)
+#   sq8   - scalar int8 quantization, 4x smaller, still a full scan
+#   ivfpq - IVF coarse quantizer + product quantization; searches only
+#           nprobe of the inverted lists
+#
+# nprobe is calibrated when an IVF index is built (calibrate_nprobe): the
+# smallest value whose recall@10 against exact search reaches
+# CAPA_IVF_RECALL_TARGET, or, when the PQ codes cap recall below the
+# target, the smallest value within CAPA_IVF_RECALL_SLACK of that cap.
+# It is saved in index.faiss; CAPA_IVF_NPROBE overrides it.
+#
+# Compressed modes are trained (codebooks) before vectors are added; the
+# trained quantizers are saved inside index.faiss with the rest of the index.
+
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+
+MODES = ("flat", "sq8", "ivfpq")
+INDEX_MODE = os.getenv("CAPA_INDEX_MODE", "flat").lower()
+
+IVF_NLIST = int(os.getenv("CAPA_IVF_NLIST", "0"))        # 0 = 4 * sqrt(n)
+IVF_NPROBE = int(os.getenv("CAPA_IVF_NPROBE", "0"))       # 0 = calibrated
+IVF_RECALL_TARGET = float(os.getenv("CAPA_IVF_RECALL_TARGET", "0.95"))
+IVF_RECALL_SLACK = float(os.getenv("CAPA_IVF_RECALL_SLACK", "0.01"))
+CALIBRATION_QUERIES = int(os.getenv("CAPA_IVF_CALIBRATION_QUERIES", "200"))
+PQ_M = int(os.getenv("CAPA_PQ_M", "48"))                 # sub-quantizers (bytes per vector)
+PQ_NBITS = 8
+TRAIN_SIZE = int(os.getenv("CAPA_TRAIN_SIZE", "100000"))
+
+# Below this many vectors IVF-PQ cannot be trained sensibly; sq8 is used instead
+IVFPQ_MIN_VECTORS = int(os.getenv("CAPA_IVFPQ_MIN_VECTORS", "10000"))
+
+
+def resolve_mode(mode: str, n_vectors: int) -> str:
+    if mode not in MODES:
+        raise ValueError(f"[index_modes] Unknown CAPA_INDEX_MODE {mode!r}; expected one of {MODES}")
+    if mode == "ivfpq" and n_vectors < IVFPQ_MIN_VECTORS:
+        print(f"⚠ {n_vectors} vectors is too few to train IVF-PQ; using sq8.")
+        return "sq8"
+    return mode
+
+
+def _pq_m(dim: int) -> int:
+    """Largest divisor of dim not above PQ_M."""
+    m = max(1, min(PQ_M, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _nlist(n_vectors: int) -> int:
+    nlist = IVF_NLIST or int(4 * math.sqrt(n_vectors))
+    # k-means wants ~39 training points per centroid
+    return max(1, min(nlist, n_vectors // 39))
+
+
+def factory_string(mode: str, dim: int, n_vectors: int) -> str:
+    if mode == "flat":
+        return "Flat"
+    if mode == "sq8":
+        return "SQ8"
+    return f"IVF{_nlist(n_vectors)},PQ{_pq_m(dim)}x{PQ_NBITS}"
+
+
+def tune(index: faiss.Index) -> faiss.Index:
+    """Apply a CAPA_IVF_NPROBE override to an IVF index; no-op otherwise."""
+    ivf = _ivf(index)
+    if ivf is not None and IVF_NPROBE > 0:
+        ivf.nprobe = min(IVF_NPROBE, ivf.nlist)
+    return index
+
+
+def _ivf(index: faiss.Index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def train_index(mode: str, vectors: np.ndarray, seed: int = 0) -> faiss.Index:
+    """Empty index of the given mode, trained on (a sample of) vectors."""
+    n, dim = vectors.shape
+    index = faiss.index_factory(dim, factory_string(mode, dim, n), faiss.METRIC_L2)
+
+    if not index.is_trained:
+        sample = vectors
+        if n > TRAIN_SIZE:
+            rows = np.random.default_rng(seed).choice(n, TRAIN_SIZE, replace=False)
+            sample = vectors[np.sort(rows)]
+        print(f"🧮 Training {factory_string(mode, dim, n)} on {len(sample)} vectors...")
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    return tune(index)
+
+
+def mode_of(index: faiss.Index) -> str:
+    if _ivf(index) is not None:
+        return "ivfpq"
+    if isinstance(faiss.downcast_index(index), faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def search_params(index: faiss.Index, sel=None):
+    """
+    SearchParameters matching the index type. A restricted (sel) search on
+    IVF probes every list so no candidate is missed.
+    """
+    ivf = _ivf(index)
+    if ivf is None:
+        return faiss.SearchParameters(sel=sel)
+    nprobe = ivf.nlist if sel is not None else ivf.nprobe
+    return faiss.SearchParametersIVF(sel=sel, nprobe=nprobe)
+
+
+def compact_ids(index: faiss.Index, removed: Sequence[int]):
+    """
+    After remove_ids, flat-code indexes renumber their rows but IVF keeps
+    the original ids. Shift the surviving IVF ids down so they are
+    0..ntotal-1 again, matching LangChain's index_to_docstore_id.
+    """
+    ivf = _ivf(index)
+    if ivf is None or len(removed) == 0:
+        return
+
+    removed = np.sort(np.asarray(removed, dtype=np.int64))
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size == 0:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+        ids -= np.searchsorted(removed, ids)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+# ---------- nprobe calibration ----------
+def nprobe_values(nlist: int) -> List[int]:
+    """Powers of two up to nlist, plus nlist itself (every list)."""
+    values = []
+    n = 1
+    while n < nlist:
+        values.append(n)
+        n *= 2
+    return values + [nlist]
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def pick_nprobe(sweep: Sequence[Dict], target: float = IVF_RECALL_TARGET,
+                slack: float = IVF_RECALL_SLACK) -> Dict:
+    """
+    Smallest nprobe reaching target recall; if no nprobe does (PQ caps
+    recall), the smallest within slack of the best recall of the sweep.
+    """
+    best = max(r["recall_at_k"] for r in sweep)
+    goal = min(target, best - slack)
+    return next(r for r in sweep if r["recall_at_k"] >= goal)
+
+
+def calibrate_nprobe(index: faiss.Index, vectors: np.ndarray, k: int = 10,
+                     target: float = IVF_RECALL_TARGET,
+                     n_queries: int = CALIBRATION_QUERIES, seed: int = 0) -> Optional[Dict]:
+    """
+    Set the IVF index's nprobe (see pick_nprobe), measuring recall against
+    exact search with a sample of the indexed vectors as queries. vectors
+    must be the indexed vectors in id order. Returns the chosen sweep row
+    (None for non-IVF indexes, or with CAPA_IVF_NPROBE set).
+    """
+    ivf = _ivf(index)
+    if ivf is None or IVF_NPROBE > 0 or index.ntotal == 0:
+        return None
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors) - 1)
+    rows = np.random.default_rng(seed).choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+
+    # A query's own vector is trivially found; compare the k neighbours after it.
+    # faiss.knn brute-forces without copying vectors into another index.
+    _, truth = faiss.knn(vectors[rows], vectors, k + 1)
+    truth = np.array([[i for i in row if i != own][:k] for row, own in zip(truth, rows)])
+
+    sweep = []
+    for nprobe in nprobe_values(ivf.nlist):
+        _, found = index.search(vectors[rows], k + 1, params=faiss.SearchParametersIVF(nprobe=nprobe))
+        found = [[i for i in row if i != own][:k] for row, own in zip(found, rows)]
+        sweep.append({"nprobe": nprobe, "recall_at_k": round(_recall(found, truth), 4)})
+
+    chosen = pick_nprobe(sweep, target)
+    ivf.nprobe = chosen["nprobe"]
+    if chosen["recall_at_k"] < target:
+        print(f"⚠ IVF-PQ recall@{k} tops out at {max(r['recall_at_k'] for r in sweep)} "
+              f"(below the {target} target; raise CAPA_PQ_M); nprobe={chosen['nprobe']}.")
+    else:
+        print(f"🎯 nprobe={chosen['nprobe']} of {ivf.nlist} lists: recall@{k} {chosen['recall_at_k']}.")
+    return chosen
+
+
+# ---------- Recall / latency report ----------
+def _measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, batch: int, params=None) -> Dict:
+    k = truth.shape[1]
+    found = np.empty_like(truth)
+    timings = []
+    for start in range(0, len(queries), batch):
+        chunk = queries[start:start + batch]
+        t0 = time.perf_counter()
+        _, found[start:start + batch] = index.search(chunk, k, params=params)
+        timings.append((time.perf_counter() - t0) * 1000 / len(chunk))
+    return {
+        "recall_at_k": round(_recall(found, truth), 4),
+        "latency_ms_mean": round(float(np.mean(timings)), 4),
+        "latency_ms_p95": round(float(np.percentile(timings, 95)), 4),
+    }
+
+
+def index_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                 modes: Sequence[str] = MODES, batch: int = 1) -> List[Dict]:
+    """
+    Build every mode over the same vectors and compare against exact
+    search: recall@k (overlap with the flat top-k), per-query latency
+    (mean / p95 ms at the given batch size) and serialized index size.
+    IVF modes get one row per nprobe (a recall-vs-latency curve); the
+    calibrated default is marked "default".
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+
+    rows = []
+    for mode in modes:
+        actual = resolve_mode(mode, len(vectors))
+        index = flat if actual == "flat" else train_index(actual, vectors)
+        if index is not flat:
+            index.add(vectors)
+
+        base = {"mode": mode, "built_as": actual, "index_mb": round(index_bytes(index) / 1e6, 2)}
+        ivf = _ivf(index)
+        if ivf is None:
+            rows.append({**base, "nprobe": None, "default": True, **_measure(index, queries, truth, batch)})
+            continue
+
+        calibrate_nprobe(index, vectors, k)
+        default = ivf.nprobe
+        for nprobe in sorted(set(nprobe_values(ivf.nlist)) | {default}):
+            params = faiss.SearchParametersIVF(nprobe=nprobe)
+            rows.append({**base, "nprobe": nprobe, "default": nprobe == default,
+                         **_measure(index, queries, truth, batch, params)})
+
+    return rows
+
+
+if __name__ == "__main__":
+    # Recall-vs-latency report for the index modes:
+    #   python -m shared.index_modes                      # embedded CAPA library
+    #   python -m shared.index_modes --synthetic 200000   # random vectors at scale
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare CAPA index modes against flat search")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random 384-d vectors")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        # Clustered data; uniform random vectors are unrealistically hard for PQ
+        centers = rng.standard_normal((max(1, args.synthetic // 1000), 384)).astype(np.float32)
+        data = centers[rng.integers(len(centers), size=args.synthetic)]
+        data += 0.3 * rng.standard_normal(data.shape).astype(np.float32)
+    else:
+        from .vectorstore import LazyEmbeddings
+        from .shared_loader import load_capa_rca_docs
+        docs = load_capa_rca_docs()
+        data = np.asarray(LazyEmbeddings().embed_documents([d.page_content for d in docs]), dtype=np.float32)
+
+    picks = rng.choice(len(data), min(args.queries, len(data)), replace=False)
+    qs = data[picks] + 0.05 * rng.standard_normal((len(picks), data.shape[1])).astype(np.float32)
+
+    report = index_report(data, qs, k=args.k, batch=args.batch)
+    print(f"recall target {IVF_RECALL_TARGET} (slack {IVF_RECALL_SLACK}); * = default nprobe")
+    print(f"{'mode':<7} {'built':<7} {'nprobe':>7} {'recall@' + str(args.k):>10} {'mean ms':>9} {'p95 ms':>9} {'MB':>9}")
+    for r in report:
+        nprobe = "-" if r["nprobe"] is None else f"{r['nprobe']}{'*' if r['default'] else ''}"
+        print(f"{r['mode']:<7} {r['built_as']:<7} {nprobe:>7} {r['recall_at_k']:>10} "
+              f"{r['latency_ms_mean']:>9} {r['latency_ms_p95']:>9} {r['index_mb']:>9}")
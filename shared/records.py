@@ -0,0 +1,203 @@
+# shared/records.py
+#
+# Immutable record types for the fleet data. Normalization happens once in
+# from_raw(), so cached records can be shared across requests without
+# copying. to_dict() rebuilds the plain-dict shape the loaders return.
+#
+# A field left at None is treated as absent: get() falls back to the
+# caller's default and to_dict() omits the key (except the normalized
+# date/timestamp, which the loaders have always set, even to None). Keys the
+# raw data set explicitly to null are remembered in `nulls`, so get() and
+# to_dict() return None for them just like the raw dict did.
+
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
+
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+_MISSING = object()
+
+# Bookkeeping fields, not record data
+_META = ("extra", "nulls")
+
+
+def _split(raw: Dict[str, Any], known: Tuple[str, ...]) -> Mapping[str, Any]:
+    extra = {k: v for k, v in raw.items() if k not in known}
+    return MappingProxyType(extra) if extra else _EMPTY
+
+
+def _nulls(values: Dict[str, Any], *normalized: str) -> FrozenSet[str]:
+    """Known keys given as null in the raw data (normalized keys are always recomputed)."""
+    return frozenset(k for k, v in values.items() if v is None and k not in normalized)
+
+
+class _Record:
+    __slots__ = ()
+
+    _list_fields: Tuple[str, ...] = ()
+    _keep_none: Tuple[str, ...] = ()
+    _with_exists = True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """dict-style read access, so records can stand in for loader dicts."""
+        value = getattr(self, key, _MISSING) if key not in _META else _MISSING
+        if value is _MISSING:
+            return self.extra.get(key, default)
+        if key in self.nulls:
+            return None
+        return default if value is None else value
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.extra)
+        for f in fields(self):
+            if f.name in _META:
+                continue
+            if f.name in self.nulls:
+                out[f.name] = None
+                continue
+            value = getattr(self, f.name)
+            if value is None and f.name not in self._keep_none:
+                continue
+            out[f.name] = list(value) if f.name in self._list_fields else value
+        if self._with_exists:
+            out["exists"] = True
+        return out
+
+
+def _known(cls) -> Tuple[str, ...]:
+    return tuple(f.name for f in fields(cls) if f.name not in _META)
+
+
+# ---------- 1. VEHICLE PROFILE ----------
+@dataclass(frozen=True, slots=True)
+class VehicleProfile(_Record):
+    vehicle_id: str
+    type: Optional[str] = None
+    model: Optional[str] = None
+    manufacturing_year: Optional[int] = None
+    owner: Optional[str] = None
+    city: Optional[str] = None
+    climate_zone: Optional[str] = None
+    avg_km_per_day: Optional[float] = None
+    odometer: Optional[float] = None
+    warranty_status: Optional[str] = None
+    cost_sensitivity: Any = False
+    known_model_defect: Any = "none"
+    risk_index: float = 0.3
+    extra: Mapping[str, Any] = field(default_factory=lambda: _EMPTY, compare=False)
+    nulls: FrozenSet[str] = field(default=frozenset(), compare=False)
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any], risk_index: float) -> "VehicleProfile":
+        known = _known(cls)
+        values = {k: raw[k] for k in known if k in raw}
+        nulls = _nulls(values, "risk_index")
+        values["risk_index"] = risk_index
+        return cls(**values, extra=_split(raw, known + ("exists",)), nulls=nulls)
+
+
+# ---------- 2. MAINTENANCE RECORD ----------
+@dataclass(frozen=True, slots=True)
+class MaintenanceRecord(_Record):
+    vehicle_id: str
+    date: Optional[datetime] = None
+    issue_reported: Optional[str] = None
+    components_serviced: Tuple[Any, ...] = ()
+    parts_replaced: Tuple[Any, ...] = ()
+    warranty_applied: Any = False
+    customer_declined_parts_replacement: Any = None
+    extra: Mapping[str, Any] = field(default_factory=lambda: _EMPTY, compare=False)
+    nulls: FrozenSet[str] = field(default=frozenset(), compare=False)
+
+    _list_fields = ("components_serviced", "parts_replaced")
+    _keep_none = ("date",)
+    _with_exists = False
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any]) -> "MaintenanceRecord":
+        # Robust date parsing
+        date_str = raw.get("date")
+        try:
+            date = datetime.fromisoformat(date_str) if date_str else None
+        except Exception:
+            date = None
+
+        known = _known(cls)
+        values = {k: raw[k] for k in known if k in raw}
+        nulls = _nulls(values, "date")
+        values["date"] = date
+        values["components_serviced"] = tuple(raw.get("components_serviced") or ())
+        values["parts_replaced"] = tuple(raw.get("parts_replaced") or ())
+        return cls(**values, extra=_split(raw, known + ("exists",)), nulls=nulls)
+
+
+# ---------- 3. TELEMATICS READING ----------
+def parse_timestamp(ts) -> Optional[datetime]:
+    """Naive UTC datetime; offset timestamps are converted so all readings compare."""
+    if not isinstance(ts, datetime):
+        try:
+            ts = datetime.fromisoformat(ts.replace("Z", "")) if ts else None
+        except Exception:
+            return None
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+# engine_temp_status cut points: normal < 85 <= elevated <= 100 < overheating
+ENGINE_TEMP_STATUS_CUTS = (85, 100)
+
+
+def engine_temp_status(engine_temp) -> str:
+    elevated_from, overheating_above = ENGINE_TEMP_STATUS_CUTS
+    if engine_temp < elevated_from:
+        return "normal"
+    if engine_temp <= overheating_above:
+        return "elevated"
+    return "overheating"
+
+
+@dataclass(frozen=True, slots=True)
+class TelematicsReading(_Record):
+    vehicle_id: str
+    timestamp: Optional[datetime] = None
+    engine_temp_c: Optional[float] = None
+    rpm: Optional[int] = None
+    vehicle_speed_kmph: Optional[float] = None
+    battery_health_pct: Optional[float] = None
+    brake_pad_wear_pct: Optional[float] = None
+    oil_pressure_psi: Optional[float] = None
+    coolant_temp_c: Optional[float] = None
+    intake_air_temp_c: Optional[float] = None
+    fuel_efficiency_kmpl: Optional[float] = None
+    dtc_code: Any = None
+    gps_lat: Optional[float] = None
+    gps_lon: Optional[float] = None
+    dtc_code_list: Tuple[Any, ...] = ()
+    engine_temp_status: str = "normal"
+    extra: Mapping[str, Any] = field(default_factory=lambda: _EMPTY, compare=False)
+    nulls: FrozenSet[str] = field(default=frozenset(), compare=False)
+
+    _list_fields = ("dtc_code_list",)
+    _keep_none = ("timestamp",)
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any]) -> "TelematicsReading":
+        known = _known(cls)
+        values = {k: raw[k] for k in known if k in raw}
+        nulls = _nulls(values, "timestamp", "dtc_code_list", "engine_temp_status")
+
+        # Normalize timestamp
+        values["timestamp"] = parse_timestamp(raw.get("timestamp"))
+
+        # Normalize DTC
+        dtc = raw.get("dtc_code")
+        values["dtc_code_list"] = tuple(dtc) if isinstance(dtc, (list, tuple)) else (dtc,)
+
+        # Simple engine temp status
+        values["engine_temp_status"] = engine_temp_status(raw.get("engine_temp_c") or 0)
+
+        return cls(**values, extra=_split(raw, known + ("exists",)), nulls=nulls)
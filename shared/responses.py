@@ -0,0 +1,70 @@
+# shared/responses.py
+#
+# One-pass JSON serialization for agent responses.
+#
+# FastJSONResponse encodes the endpoint's return value directly to bytes
+# (orjson when installed, stdlib json otherwise). datetimes, NumPy arrays /
+# scalars, records and mapping proxies are handled by the encoder itself,
+# so responses are no longer rebuilt by clean_json or jsonable_encoder first.
+#
+# Return FastJSONResponse(result) from an endpoint to skip FastAPI's own
+# jsonable_encoder pass; default_response_class=FastJSONResponse covers the rest.
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib fallback below
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Types neither encoder handles natively."""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+
+else:
+    _encoder = json.JSONEncoder(
+        default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    )
+
+    def dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,219 @@
+# shared/retrieval.py
+#
+# Hybrid CAPA/RCA retrieval: a BM25 inverted index over the CAPA text
+# alongside the FAISS index, fused with reciprocal-rank fusion.
+#
+# Modes (CAPA_RETRIEVAL_MODE):
+#   hybrid  - BM25 + dense, fused (default)
+#   dense   - FAISS only
+#   lexical - BM25 only; never imports or loads the embedding model
+#
+# The lexical index (and the DTC index built alongside it) is rebuilt
+# whenever capa_rca_library.json changes; capa_library_version() lets
+# dependent caches notice, including in lexical mode where the vectorstore
+# is never rebuilt.
+
+import heapq
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+from .dtc_index import DTCIndex
+from .fleet_store import get_fleet_store
+from .shared_loader import capa_rca_documents
+
+
+MODES = ("hybrid", "dense", "lexical")
+DEFAULT_MODE = os.getenv("CAPA_RETRIEVAL_MODE", "hybrid").lower()
+
+RRF_K = 60
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+# ---------- BM25 ----------
+class BM25Index:
+    """Okapi BM25 over a fixed document list (postings held per term)."""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_len: List[int] = []
+
+        for doc_idx, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_idx, tf))
+
+        n = len(self.doc_len)
+        self.avg_len = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    def search(self, query: str, k: int, among: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (doc_idx, score), best first. Documents with no term overlap
+        are skipped; among restricts scoring to those doc indices.
+        """
+        scores: Dict[int, float] = {}
+        k1, b, avg = self.k1, self.b, self.avg_len or 1.0
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_idx, tf in postings:
+                if among is not None and doc_idx not in among:
+                    continue
+                norm = k1 * (1 - b + b * self.doc_len[doc_idx] / avg)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+
+
+class _LexicalIndex:
+    __slots__ = ("documents", "positions", "bm25", "dtc")
+
+    def __init__(self, documents: List[Document]):
+        self.documents = documents
+        self.positions = {d.metadata.get("id"): i for i, d in enumerate(documents)}
+        self.bm25 = BM25Index([d.page_content for d in documents])
+        self.dtc = DTCIndex(documents)
+
+
+def _build_lexical(data) -> _LexicalIndex:
+    entries = data if isinstance(data, list) else [data]
+    return _LexicalIndex(capa_rca_documents(entries))
+
+
+def _library_dataset():
+    return get_fleet_store().dataset("capa_rca_library.json", _build_lexical)
+
+
+def _lexical_index() -> _LexicalIndex:
+    return _library_dataset().index()
+
+
+def capa_library_dtc_index() -> DTCIndex:
+    return _lexical_index().dtc
+
+
+def capa_library_version() -> int:
+    """Bumped each time capa_rca_library.json is re-parsed."""
+    ds = _library_dataset()
+    ds.index()
+    return ds.version
+
+# ---------- Retriever ----------
+def _doc_id(doc: Document):
+    return doc.metadata.get("id", doc.page_content)
+
+
+class CapaRetriever:
+
+    def __init__(self, mode: str = DEFAULT_MODE):
+        if mode not in MODES:
+            raise ValueError(f"[retrieval] Unknown mode {mode!r}; expected one of {MODES}")
+        self.mode = mode
+
+    @property
+    def uses_dense(self) -> bool:
+        return self.mode != "lexical"
+
+    def lexical(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        index = _lexical_index()
+        return [(index.documents[i], score) for i, score in index.bm25.search(query, k)]
+
+    def lexical_among(self, query: str, doc_ids: Iterable[str], k: int) -> List[Document]:
+        """
+        BM25 restricted to the given document ids. Candidates without any
+        term overlap keep their given order after the scored ones.
+        """
+        index = _lexical_index()
+        doc_ids = [i for i in doc_ids if i in index.positions]
+        allowed = {index.positions[i] for i in doc_ids}
+
+        ranked = [index.documents[i] for i, _ in index.bm25.search(query, k, among=allowed)]
+        seen = {_doc_id(d) for d in ranked}
+        for i in doc_ids:
+            if len(ranked) >= k:
+                break
+            if i not in seen:
+                ranked.append(index.documents[index.positions[i]])
+        return ranked
+
+    def _dense_many(self, queries: Sequence[str], k: int) -> List[List[Document]]:
+        from .vectorstore import search_many
+        return search_many(queries, k=k)
+
+    @staticmethod
+    def _fuse(rankings: Sequence[Sequence[Document]], k: int) -> List[Tuple[Document, float]]:
+        """Reciprocal-rank fusion of several ranked lists."""
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking):
+                key = _doc_id(doc)
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(docs[key], score) for key, score in best]
+
+    def search_many_with_scores(self, queries: Sequence[str], k: int = 3,
+                                mode: Optional[str] = None) -> List[List[Tuple[Document, float]]]:
+        mode = mode or self.mode
+        if not queries:
+            return []
+
+        if mode == "lexical":
+            return [self.lexical(q, k) for q in queries]
+
+        if mode == "dense":
+            # Dense results are already ranked; report rank-based scores
+            return [
+                [(d, 1.0 / (rank + 1)) for rank, d in enumerate(docs)]
+                for docs in self._dense_many(queries, k)
+            ]
+
+        fetch_k = max(k * 4, 20)
+        dense = self._dense_many(queries, fetch_k)
+        return [
+            self._fuse([[d for d, _ in self.lexical(q, fetch_k)], dense_docs], k)
+            for q, dense_docs in zip(queries, dense)
+        ]
+
+    def search_with_scores(self, query: str, k: int = 3,
+                           mode: Optional[str] = None) -> List[Tuple[Document, float]]:
+        return self.search_many_with_scores([query], k, mode)[0]
+
+    def search_many(self, queries: Sequence[str], k: int = 3, mode: Optional[str] = None) -> List[List[Document]]:
+        return [[d for d, _ in hits] for hits in self.search_many_with_scores(queries, k, mode)]
+
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Document]:
+        return self.search_many([query], k, mode)[0]
+
+
+_retriever = None
+
+
+def get_retriever() -> CapaRetriever:
+    global _retriever
+
+    if _retriever is None:
+        _retriever = CapaRetriever()
+
+    return _retriever
@@ -0,0 +1,115 @@
+# shared/risk_index.py
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+DEFAULT_RISK = 0.3
+
+
+def _year(value) -> float:
+    try:
+        return float(int(value))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def compute_risk_indices(profiles: List[Dict[str, Any]], year: Optional[int] = None) -> np.ndarray:
+    """
+    Vectorized form of the per-vehicle risk score:
+        min((age * 0.3 + avg_km_per_day * 0.02) * climate_factor, 1.0)
+    Profiles whose inputs cannot be parsed get DEFAULT_RISK.
+    """
+    year = year or datetime.now().year
+
+    mfg = np.fromiter(
+        (_year(p.get("manufacturing_year", 2020)) for p in profiles),
+        dtype=np.float64, count=len(profiles),
+    )
+    usage = np.fromiter(
+        (_number(p.get("avg_km_per_day", 10)) for p in profiles),
+        dtype=np.float64, count=len(profiles),
+    )
+    hot = np.fromiter(
+        (p.get("climate_zone") == "Hot" for p in profiles),
+        dtype=bool, count=len(profiles),
+    )
+
+    age = year - mfg
+    climate_factor = np.where(hot, 1.2, 1.0)
+    risk = np.minimum((age * 0.3 + usage * 0.02) * climate_factor, 1.0)
+    risk = np.round(risk, 2)
+
+    return np.where(np.isnan(risk), DEFAULT_RISK, risk)
+
+
+class FleetRiskTable:
+    """
+    Column arrays over the whole fleet (vehicle_id, risk_index, city, model)
+    for fast ranking. City and model are held as integer category codes.
+    """
+
+    def __init__(self, profiles: List[Dict[str, Any]]):
+        self.vehicle_ids = np.array([p.get("vehicle_id") for p in profiles], dtype=object)
+        self.risk = np.array([p.get("risk_index", DEFAULT_RISK) for p in profiles], dtype=np.float64)
+        self.city = np.array([p.get("city") for p in profiles], dtype=object)
+        self.model = np.array([p.get("model") for p in profiles], dtype=object)
+
+        self._cities, self._city_codes = np.unique(
+            np.array([str(p.get("city") or "").lower() for p in profiles], dtype=object),
+            return_inverse=True,
+        )
+        self._models, self._model_codes = np.unique(
+            np.array([str(p.get("model") or "").lower() for p in profiles], dtype=object),
+            return_inverse=True,
+        )
+        self._city_lookup = {c: i for i, c in enumerate(self._cities)}
+        self._model_lookup = {m: i for i, m in enumerate(self._models)}
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def _mask(self, city: Optional[str], model: Optional[str]) -> Optional[np.ndarray]:
+        mask = None
+        if city:
+            code = self._city_lookup.get(city.strip().lower(), -1)
+            mask = self._city_codes == code
+        if model:
+            code = self._model_lookup.get(model.strip().lower(), -1)
+            m = self._model_codes == code
+            mask = m if mask is None else mask & m
+        return mask
+
+    def filter_mask(self, city: Optional[str] = None, model: Optional[str] = None) -> np.ndarray:
+        """Boolean row mask for the city / model filters (all True when unfiltered)."""
+        mask = self._mask(city, model)
+        return np.ones(len(self), dtype=bool) if mask is None else mask
+
+    def top_k(self, k: int, city: Optional[str] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Highest-risk vehicles first, optionally filtered by city and/or model."""
+        mask = self._mask(city, model)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+
+        k = max(0, min(k, len(rows)))
+        if k == 0:
+            return []
+
+        if k < len(rows):
+            rows = rows[np.argpartition(-self.risk[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-self.risk[rows], kind="stable")]
+
+        return [
+            {
+                "vehicle_id": self.vehicle_ids[i],
+                "risk_index": float(self.risk[i]),
+                "city": self.city[i],
+                "model": self.model[i],
+            }
+            for i in rows
+        ]
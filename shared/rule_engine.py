@@ -0,0 +1,219 @@
+# shared/rule_engine.py
+#
+# Declarative threshold rules (shared/rules.json, or RULES_CONFIG).
+#
+# Each rule set has:
+#   label_key - key the rule "type" is reported under ("type" / "issue")
+#   defaults  - value used when a signal is missing
+#   rules     - {signal, op, threshold, component, type, severity[, group]}
+#
+# Rules sharing a "group" are exclusive: only the first one that matches
+# fires (an if/elif chain). Alerts are emitted in rule order.
+#
+# Optional per-rule "hysteresis" (signal units) and "cooldown_seconds" are
+# used by alert state tracking, not by evaluation itself.
+
+import json
+import operator
+import os
+import threading
+from typing import Any, Dict, List, Mapping, Sequence
+
+import numpy as np
+
+
+RULES_CONFIG = os.getenv(
+    "RULES_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"),
+)
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3}
+
+
+def _value(reading, signal: str):
+    """Numeric signal from a dict or record; None if missing or not a number."""
+    v = reading.get(signal) if isinstance(reading, Mapping) else getattr(reading, signal, None)
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(v) else v
+
+
+class RuleSet:
+    """A compiled rule table: scalar evaluate() plus a vectorized fleet path."""
+
+    def __init__(self, name: str, rules: Sequence[Dict[str, Any]],
+                 label_key: str = "type", defaults: Mapping[str, float] = None):
+        self.name = name
+        self.label_key = label_key
+        self.defaults = dict(defaults or {})
+        self.rules = [dict(r) for r in rules]
+
+        self._ops = []
+        self._thresholds = []
+        self._signals = []
+        self._groups = []
+        self._templates = []
+
+        for r in rules:
+            if r["op"] not in OPERATORS:
+                raise ValueError(f"[rule_engine] {name}: unknown operator {r['op']!r}")
+            self._signals.append(r["signal"])
+            self._ops.append(OPERATORS[r["op"]])
+            self._thresholds.append(float(r["threshold"]))
+            self._groups.append(r.get("group"))
+            self._templates.append({
+                "component": r["component"],
+                label_key: r["type"],
+                "severity": r["severity"],
+            })
+
+        self.signals = list(dict.fromkeys(self._signals))
+
+    def __len__(self):
+        return len(self._templates)
+
+    def _default(self, signal: str) -> float:
+        return float(self.defaults.get(signal, np.nan))
+
+    # ---- one vehicle ----
+    def evaluate(self, reading) -> List[Dict[str, Any]]:
+        values = {}
+        for s in self.signals:
+            v = _value(reading, s)
+            values[s] = self._default(s) if v is None else v
+
+        alerts = []
+        fired_groups = set()
+        for signal, op, threshold, group, tpl in zip(
+            self._signals, self._ops, self._thresholds, self._groups, self._templates
+        ):
+            if group is not None and group in fired_groups:
+                continue
+            if op(values[signal], threshold):
+                alerts.append(dict(tpl))
+                if group is not None:
+                    fired_groups.add(group)
+        return alerts
+
+    def still_firing(self, reading, index: int, margin: float = 0.0) -> bool:
+        """
+        Whether rule `index` holds for the reading with its threshold relaxed
+        by margin towards the normal range (hysteresis for an active alert).
+        """
+        rule = self.rules[index]
+        signal, op = rule["signal"], rule["op"]
+        v = _value(reading, signal)
+        if v is None:
+            v = self._default(signal)
+        threshold = self._thresholds[index]
+        if op in (">", ">="):
+            threshold -= margin
+        elif op in ("<", "<="):
+            threshold += margin
+        return bool(self._ops[index](v, threshold))
+
+    # ---- fleet ----
+    def columns(self, readings: Sequence) -> Dict[str, np.ndarray]:
+        """Signal columns (float64, NaN for missing) for a list of dicts or records."""
+        as_dicts = bool(readings) and isinstance(readings[0], Mapping)
+        out = {}
+        for s in self.signals:
+            try:
+                raw = [r.get(s) for r in readings] if as_dicts else [getattr(r, s, None) for r in readings]
+                out[s] = np.array(raw, dtype=np.float64)
+            except (AttributeError, TypeError, ValueError):
+                # Mixed or non-numeric input: coerce one value at a time
+                out[s] = np.array([_value(r, s) for r in readings], dtype=np.float64)
+        return out
+
+    def evaluate_matrix(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """
+        Boolean (n_vehicles, n_rules) matrix of fired rules, with exclusive
+        groups applied. columns maps signal -> float array (NaN = missing).
+        """
+        filled = {}
+        for s in self.signals:
+            col = np.asarray(columns[s], dtype=np.float64)
+            filled[s] = np.where(np.isnan(col), self._default(s), col)
+
+        n = len(next(iter(filled.values()))) if filled else 0
+        fired = np.zeros((n, len(self)), dtype=bool)
+        taken: Dict[str, np.ndarray] = {}
+
+        for j, (signal, op, threshold, group) in enumerate(
+            zip(self._signals, self._ops, self._thresholds, self._groups)
+        ):
+            hit = op(filled[signal], threshold)
+            if group is not None:
+                prior = taken.get(group)
+                if prior is not None:
+                    hit &= ~prior
+                    prior |= hit
+                else:
+                    taken[group] = hit.copy()
+            fired[:, j] = hit
+
+        return fired
+
+    def alerts_for(self, fired_row: np.ndarray) -> List[Dict[str, Any]]:
+        """Alert dicts for one row of evaluate_matrix(), in rule order."""
+        return [dict(self._templates[j]) for j in np.flatnonzero(fired_row).tolist()]
+
+    def evaluate_many(self, readings: Sequence) -> List[List[Dict[str, Any]]]:
+        """evaluate() for every reading, computed in one vectorized pass."""
+        if not readings:
+            return []
+        fired = self.evaluate_matrix(self.columns(readings))
+        templates = self._templates
+        out: List[List[Dict[str, Any]]] = [[] for _ in readings]
+        # np.nonzero walks row-major, so each vehicle's alerts stay in rule order
+        for i, j in zip(*(idx.tolist() for idx in np.nonzero(fired))):
+            out[i].append(dict(templates[j]))
+        return out
+
+
+# ---------- Config ----------
+_rule_sets: Dict[str, RuleSet] = {}
+_lock = threading.Lock()
+
+
+def load_rule_sets(path: str = RULES_CONFIG) -> Dict[str, RuleSet]:
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return {
+        name: RuleSet(name, spec["rules"], spec.get("label_key", "type"), spec.get("defaults"))
+        for name, spec in config.items()
+    }
+
+
+def get_rule_set(name: str) -> RuleSet:
+    if not _rule_sets:
+        with _lock:
+            if not _rule_sets:
+                _rule_sets.update(load_rule_sets())
+
+    try:
+        return _rule_sets[name]
+    except KeyError:
+        raise KeyError(f"[rule_engine] No rule set named {name!r} in {RULES_CONFIG}") from None
+
+
+def reload_rule_sets():
+    """Re-read the rules config (e.g. after editing thresholds)."""
+    with _lock:
+        fresh = load_rule_sets()
+        _rule_sets.clear()
+        _rule_sets.update(fresh)
@@ -1,12 +1,18 @@
 # shared/shared_loader.py
 
+import asyncio
 import json
 import os
-from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 
 from langchain_core.documents import Document
 
+from .executors import run_io
+from .fleet_store import get_fleet_store
+from .records import MaintenanceRecord, TelematicsReading, VehicleProfile
+from .risk_index import FleetRiskTable, compute_risk_indices
+from .telematics_store import get_telematics_store
+
 
 # ---------- Base path helpers ----------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))        # /shared
@@ -25,90 +31,120 @@ def _load_json(path: str) -> Any:
 
 
 # ---------- 1. VEHICLE PROFILES ----------
-def load_vehicle_profile(vehicle_id: str) -> Dict:
-    path = _path("vehicle_profiles.json")
-    data = _load_json(path)
+def _index_profiles(records: List[Dict]) -> Dict[str, VehicleProfile]:
+    raw: Dict[str, Dict] = {}
+    for r in records:
+        vid = r.get("vehicle_id")
+        if vid is not None and vid not in raw:
+            raw[vid] = r
+
+    # Simple risk score, computed for the whole fleet in one pass
+    risks = compute_risk_indices(list(raw.values())).tolist()
+
+    return {
+        vid: VehicleProfile.from_raw(r, risk_index=risk)
+        for (vid, r), risk in zip(raw.items(), risks)
+    }
+
+
+def _profiles_dataset():
+    return get_fleet_store().dataset("vehicle_profiles.json", _index_profiles)
+
+
+def _profiles_index() -> Dict[str, VehicleProfile]:
+    return _profiles_dataset().index()
+
+
+_risk_table = None
+_risk_table_version = None
 
-    vehicles = data if isinstance(data, list) else [data]
-    v = next((x for x in vehicles if x.get("vehicle_id") == vehicle_id), None)
+
+def load_fleet_risk() -> FleetRiskTable:
+    """Fleet-wide risk arrays, rebuilt only when vehicle_profiles.json changes."""
+    global _risk_table, _risk_table_version
+
+    ds = _profiles_dataset()
+    index = ds.index()
+    if _risk_table is None or _risk_table_version != ds.version:
+        _risk_table = FleetRiskTable(list(index.values()))
+        _risk_table_version = ds.version
+
+    return _risk_table
+
+
+def get_vehicle_profile_record(vehicle_id: str) -> Optional[VehicleProfile]:
+    """Shared, immutable profile record (no copy). None if unknown."""
+    return _profiles_index().get(vehicle_id)
+
+
+def load_vehicle_profile(vehicle_id: str) -> Dict:
+    v = _profiles_index().get(vehicle_id)
 
     if v is None:
         return {"exists": False, "vehicle_id": vehicle_id, "error": f"Vehicle {vehicle_id} not found"}
 
-    # Default fields
-    v.setdefault("known_model_defect", "none")
-    v.setdefault("cost_sensitivity", False)
+    return v.to_dict()
 
-    # Simple risk score
-    try:
-        age = datetime.now().year - int(v.get("manufacturing_year", 2020))
-        usage = v.get("avg_km_per_day", 10)
-        climate_factor = 1.2 if v.get("climate_zone") == "Hot" else 1.0
-        risk = (age * 0.3 + usage * 0.02) * climate_factor
-        v["risk_index"] = round(min(risk, 1.0), 2)
-    except Exception:
-        v["risk_index"] = 0.3
 
-    v["exists"] = True
-    return v
+def load_vehicle_profiles_bulk(vehicle_ids: Iterable[str]) -> Dict[str, Dict]:
+    index = _profiles_index()
+    return {
+        vid: index[vid].to_dict() if vid in index
+        else {"exists": False, "vehicle_id": vid, "error": f"Vehicle {vid} not found"}
+        for vid in vehicle_ids
+    }
 
 
 # ---------- 2. MAINTENANCE HISTORY ----------
-def load_maintenance_history(vehicle_id: str) -> List[Dict]:
-    path = _path("maintenance_history.json")
-    data = _load_json(path)
+def _index_maintenance(records: List[Dict]) -> Dict[str, Tuple[MaintenanceRecord, ...]]:
+    index: Dict[str, List[MaintenanceRecord]] = {}
+    for r in records:
+        vid = r.get("vehicle_id")
+        if vid is not None:
+            index.setdefault(vid, []).append(MaintenanceRecord.from_raw(r))
+    return {vid: tuple(history) for vid, history in index.items()}
 
-    records = data if isinstance(data, list) else [data]
-    history = [r for r in records if r.get("vehicle_id") == vehicle_id]
 
-    for h in history:
-        # Robust date parsing
-        date_str = h.get("date")
-        try:
-            h["date"] = datetime.fromisoformat(date_str) if date_str else None
-        except Exception:
-            h["date"] = None
+def _maintenance_index() -> Dict[str, Tuple[MaintenanceRecord, ...]]:
+    return get_fleet_store().dataset("maintenance_history.json", _index_maintenance).index()
 
-        h.setdefault("components_serviced", [])
-        h.setdefault("parts_replaced", [])
-        h.setdefault("warranty_applied", False)
 
-    return history
+def get_maintenance_records(vehicle_id: str) -> Tuple[MaintenanceRecord, ...]:
+    """Shared, immutable maintenance records (no copy)."""
+    return _maintenance_index().get(vehicle_id, ())
+
+
+def load_maintenance_history(vehicle_id: str) -> List[Dict]:
+    return [h.to_dict() for h in _maintenance_index().get(vehicle_id, ())]
+
+
+def load_maintenance_history_bulk(vehicle_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+    index = _maintenance_index()
+    return {vid: [h.to_dict() for h in index.get(vid, ())] for vid in vehicle_ids}
 
 
 # ---------- 3. LIVE TELEMATICS ----------
-def load_telematics(vehicle_id: str) -> Dict:
-    path = _path("live_telematics_feed.json")
-    data = _load_json(path)
+def get_telematics_record(vehicle_id: str) -> Optional[TelematicsReading]:
+    """Shared, immutable latest reading (no copy). None if unknown."""
+    return get_telematics_store().latest(vehicle_id)
 
-    records = data if isinstance(data, list) else [data]
-    rec = next((r for r in records if r.get("vehicle_id") == vehicle_id), None)
+
+def load_telematics(vehicle_id: str) -> Dict:
+    rec = get_telematics_store().latest(vehicle_id)
 
     if rec is None:
         return {"exists": False, "vehicle_id": vehicle_id, "error": f"No telematics for {vehicle_id}"}
 
-    # Normalize timestamp
-    ts = rec.get("timestamp")
-    try:
-        rec["timestamp"] = datetime.fromisoformat(ts.replace("Z", "")) if ts else None
-    except Exception:
-        rec["timestamp"] = None
-
-    # Normalize DTC
-    dtc = rec.get("dtc_code")
-    rec["dtc_code_list"] = dtc if isinstance(dtc, list) else [dtc]
+    return rec.to_dict()
 
-    # Simple engine temp status
-    engine_temp = rec.get("engine_temp_c", 0)
-    if engine_temp < 85:
-        rec["engine_temp_status"] = "normal"
-    elif engine_temp <= 100:
-        rec["engine_temp_status"] = "elevated"
-    else:
-        rec["engine_temp_status"] = "overheating"
 
-    rec["exists"] = True
-    return rec
+def load_telematics_bulk(vehicle_ids: Iterable[str]) -> Dict[str, Dict]:
+    latest = get_telematics_store().latest_many(vehicle_ids)
+    return {
+        vid: rec.to_dict() if rec is not None
+        else {"exists": False, "vehicle_id": vid, "error": f"No telematics for {vid}"}
+        for vid, rec in latest.items()
+    }
 
 
 # ---------- 4. CAPA / RCA DOCS ----------
@@ -117,6 +153,10 @@ def load_capa_rca_docs() -> List[Document]:
     data = _load_json(path)
 
     entries = data if isinstance(data, list) else [data]
+    return capa_rca_documents(entries)
+
+
+def capa_rca_documents(entries: List[Dict]) -> List[Document]:
     docs: List[Document] = []
 
     for e in entries:
@@ -138,3 +178,27 @@ def load_capa_rca_docs() -> List[Document]:
         )
 
     return docs
+
+
+# ---------- 5. ASYNC LOADERS ----------
+# Same results as the sync loaders, run on the bounded "io" pool so async
+# endpoints never block the event loop on a (re)parse of a data file.
+async def aload_vehicle_profile(vehicle_id: str) -> Dict:
+    return await run_io(load_vehicle_profile, vehicle_id)
+
+
+async def aload_maintenance_history(vehicle_id: str) -> List[Dict]:
+    return await run_io(load_maintenance_history, vehicle_id)
+
+
+async def aload_telematics(vehicle_id: str) -> Dict:
+    return await run_io(load_telematics, vehicle_id)
+
+
+async def aload_vehicle_bundle(vehicle_id: str) -> Tuple[Dict, Dict, List[Dict]]:
+    """(profile, telematics, maintenance history), loaded concurrently."""
+    return await asyncio.gather(
+        aload_vehicle_profile(vehicle_id),
+        aload_telematics(vehicle_id),
+        aload_maintenance_history(vehicle_id),
+    )
@@ -0,0 +1,163 @@
+# shared/signal_stats.py
+#
+# Streaming per-vehicle signal statistics, updated in O(1) per reading:
+# an exponentially weighted mean, variance and linear trend (slope per
+# day) for each tracked signal. Weights decay with elapsed time (half-life
+# SIGNAL_HALFLIFE_DAYS), so irregular reporting intervals are handled.
+#
+# The trend is a time-decayed least-squares fit kept as running weighted
+# sums with the time origin re-centred on the newest reading, which keeps
+# the sums small and the fit numerically stable.
+
+import math
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from .records import TelematicsReading
+
+
+TRACKED_SIGNALS = (
+    "engine_temp_c",
+    "coolant_temp_c",
+    "battery_health_pct",
+    "brake_pad_wear_pct",
+    "oil_pressure_psi",
+)
+
+HALFLIFE_DAYS = float(os.getenv("SIGNAL_HALFLIFE_DAYS", "7"))
+
+# A trend needs a few readings over a non-trivial span before it is trusted
+MIN_SAMPLES = int(os.getenv("SIGNAL_MIN_SAMPLES", "5"))
+MIN_SPAN_DAYS = float(os.getenv("SIGNAL_MIN_SPAN_DAYS", "0.5"))
+
+_SECONDS_PER_DAY = 86400.0
+
+
+class SignalStats:
+    """EW mean / variance / slope of one signal. Time is in days, 0 = newest reading."""
+
+    __slots__ = ("n", "span_days", "last", "_s0", "_s1", "_s2", "_sx", "_sxx", "_stx")
+
+    def __init__(self):
+        self.n = 0
+        self.span_days = 0.0
+        self.last: Optional[float] = None
+        self._s0 = self._s1 = self._s2 = 0.0
+        self._sx = self._sxx = self._stx = 0.0
+
+    def advance(self, dt_days: float, decay: float):
+        """Move the time origin dt_days forward and decay the existing weights."""
+        if self.n == 0:
+            return
+        # Re-centre: t -> t - dt, then weight by decay
+        s0, s1, sx = self._s0, self._s1, self._sx
+        self._s2 = decay * (self._s2 - 2 * dt_days * s1 + dt_days * dt_days * s0)
+        self._stx = decay * (self._stx - dt_days * sx)
+        self._s1 = decay * (s1 - dt_days * s0)
+        self._s0 = decay * s0
+        self._sx = decay * sx
+        self._sxx = decay * self._sxx
+        self.span_days += dt_days
+
+    def add(self, x: float):
+        """Add a value observed at t = 0 (the current origin)."""
+        self.n += 1
+        self.last = x
+        self._s0 += 1.0
+        self._sx += x
+        self._sxx += x * x
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._sx / self._s0 if self.n else None
+
+    @property
+    def variance(self) -> Optional[float]:
+        if not self.n:
+            return None
+        m = self._sx / self._s0
+        return max(0.0, self._sxx / self._s0 - m * m)
+
+    @property
+    def slope_per_day(self) -> Optional[float]:
+        """Weighted least-squares slope; None until the trend is trusted."""
+        if self.n < MIN_SAMPLES or self.span_days < MIN_SPAN_DAYS:
+            return None
+        denom = self._s0 * self._s2 - self._s1 * self._s1
+        if denom <= 1e-12:
+            return None
+        return (self._s0 * self._stx - self._s1 * self._sx) / denom
+
+    @property
+    def level(self) -> Optional[float]:
+        """Trend-line value now (t = 0); the EW mean when there is no trend yet."""
+        slope = self.slope_per_day
+        if slope is None:
+            return self.mean
+        return (self._sx - slope * self._s1) / self._s0
+
+    def days_to_cross(self, op: str, threshold: float) -> Optional[float]:
+        """
+        Days until the trend line crosses the threshold in the direction
+        of op ('<' / '<=' falling, '>' / '>=' rising). None if the signal
+        is not heading there (or is already past it).
+        """
+        slope, level = self.slope_per_day, self.level
+        if slope is None or level is None:
+            return None
+        falling = op in ("<", "<=")
+        if falling and (slope >= 0 or level <= threshold):
+            return None
+        if not falling and (slope <= 0 or level >= threshold):
+            return None
+        return (threshold - level) / slope
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        def r(v):
+            return None if v is None else round(v, 4)
+
+        variance = self.variance
+        return {
+            "samples": self.n,
+            "last": self.last,
+            "ewma": r(self.mean),
+            "variance": r(variance),
+            "std": r(None if variance is None else math.sqrt(variance)),
+            "slope_per_day": r(self.slope_per_day),
+        }
+
+
+class VehicleSignalStats:
+    """SignalStats for every tracked signal of one vehicle."""
+
+    __slots__ = ("updated_at", "signals")
+
+    def __init__(self):
+        self.updated_at: Optional[datetime] = None
+        self.signals: Dict[str, SignalStats] = {s: SignalStats() for s in TRACKED_SIGNALS}
+
+    def update(self, rec: TelematicsReading) -> bool:
+        """Fold in a reading newer than the last one; older/untimed readings are ignored."""
+        ts = rec.timestamp
+        if ts is None or (self.updated_at is not None and ts <= self.updated_at):
+            return False
+
+        if self.updated_at is not None:
+            dt = (ts - self.updated_at).total_seconds() / _SECONDS_PER_DAY
+            decay = 0.5 ** (dt / HALFLIFE_DAYS)
+            for stats in self.signals.values():
+                stats.advance(dt, decay)
+        self.updated_at = ts
+
+        for name, stats in self.signals.items():
+            v = getattr(rec, name)
+            if isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v):
+                stats.add(float(v))
+        return True
+
+    def to_dict(self) -> Dict:
+        return {
+            "updated_at": self.updated_at,
+            "signals": {name: s.to_dict() for name, s in self.signals.items() if s.n},
+        }
@@ -0,0 +1,366 @@
+# shared/sqlite_store.py
+#
+# Optional SQLite storage backend for the data/*.json datasets.
+# Enable with DRIVESPHERE_STORAGE=sqlite (DB path: DRIVESPHERE_SQLITE_PATH).
+# Populate it once from the JSON files with:
+#   python -m shared.sqlite_store [--db data/drivesphere.db]
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))        # /shared
+DATA_DIR = os.path.join(BASE_DIR, "..", "data")              # /data
+
+STORAGE_BACKEND = os.getenv("DRIVESPHERE_STORAGE", "json").lower()
+SQLITE_PATH = os.getenv("DRIVESPHERE_SQLITE_PATH", os.path.join(DATA_DIR, "drivesphere.db"))
+POOL_SIZE = int(os.getenv("DRIVESPHERE_SQLITE_POOL_SIZE", "8"))
+
+
+def use_sqlite() -> bool:
+    return STORAGE_BACKEND == "sqlite"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicle_profiles (
+    vehicle_id TEXT PRIMARY KEY,
+    city TEXT,
+    model TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vehicle_profiles_city ON vehicle_profiles (city);
+
+CREATE TABLE IF NOT EXISTS maintenance_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    vehicle_id TEXT NOT NULL,
+    date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_maintenance_vehicle_date ON maintenance_history (vehicle_id, date);
+
+CREATE TABLE IF NOT EXISTS telematics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    vehicle_id TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_telematics_vehicle_ts ON telematics (vehicle_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_telematics_ts ON telematics (timestamp);
+
+CREATE TABLE IF NOT EXISTS service_center_slots (
+    center_id TEXT PRIMARY KEY,
+    city TEXT,
+    location TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_service_center_city ON service_center_slots (city);
+
+CREATE TABLE IF NOT EXISTS past_feedback (
+    vehicle_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS agent_activity_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    agent_name TEXT,
+    vehicle_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_activity_ts ON agent_activity_logs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_activity_agent_ts ON agent_activity_logs (agent_name, timestamp);
+CREATE INDEX IF NOT EXISTS idx_activity_vehicle ON agent_activity_logs (vehicle_id);
+
+CREATE TABLE IF NOT EXISTS ueba_alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    alert_id TEXT,
+    timestamp TEXT,
+    agent_name TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts ON ueba_alerts (timestamp);
+"""
+
+
+# ---------- Connection pool ----------
+class ConnectionPool:
+    """Fixed-size, thread-safe pool of SQLite connections (WAL mode)."""
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commits on success, rolls back on error."""
+        conn = self._pool.get()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(SQLITE_PATH)
+
+    return _pool
+
+
+def _rows(sql: str, params=()) -> List[Dict[str, Any]]:
+    with get_pool().connection() as conn:
+        return [json.loads(r[0]) for r in conn.execute(sql, params)]
+
+
+# ---------- 1. VEHICLE PROFILES ----------
+def get_vehicle_profile(vehicle_id: str) -> Optional[Dict[str, Any]]:
+    rows = _rows("SELECT data FROM vehicle_profiles WHERE vehicle_id = ?", (vehicle_id,))
+    return rows[0] if rows else None
+
+
+def get_vehicle_profiles_by_city(city: str) -> List[Dict[str, Any]]:
+    return _rows("SELECT data FROM vehicle_profiles WHERE city = ?", (city,))
+
+
+# ---------- 2. MAINTENANCE HISTORY ----------
+def get_maintenance_history(vehicle_id: str) -> List[Dict[str, Any]]:
+    return _rows(
+        "SELECT data FROM maintenance_history WHERE vehicle_id = ? ORDER BY date",
+        (vehicle_id,),
+    )
+
+
+# ---------- 3. TELEMATICS ----------
+def insert_telematics(records: List[Dict[str, Any]]):
+    with get_pool().connection() as conn:
+        conn.executemany(
+            "INSERT INTO telematics (vehicle_id, timestamp, data) VALUES (?, ?, ?)",
+            [(r.get("vehicle_id"), r.get("timestamp"), json.dumps(r)) for r in records],
+        )
+
+
+def get_telematics(vehicle_id: str,
+                   start: Optional[str] = None,
+                   end: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Readings for one vehicle, oldest first; start/end are ISO strings."""
+    sql = "SELECT data FROM telematics WHERE vehicle_id = ?"
+    params: List[Any] = [vehicle_id]
+    if start:
+        sql += " AND timestamp >= ?"
+        params.append(start)
+    if end:
+        sql += " AND timestamp <= ?"
+        params.append(end)
+    return _rows(sql + " ORDER BY timestamp", params)
+
+
+def get_latest_telematics(vehicle_id: str) -> Optional[Dict[str, Any]]:
+    rows = _rows(
+        "SELECT data FROM telematics WHERE vehicle_id = ? ORDER BY timestamp DESC LIMIT 1",
+        (vehicle_id,),
+    )
+    return rows[0] if rows else None
+
+
+# ---------- 4. SERVICE CENTER SLOTS ----------
+def load_service_centers(location_contains: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    sql = "SELECT center_id, data FROM service_center_slots"
+    params: List[Any] = []
+    if location_contains:
+        sql += " WHERE instr(lower(location), ?) > 0"
+        params.append(location_contains.lower())
+
+    with get_pool().connection() as conn:
+        return {cid: json.loads(data) for cid, data in conn.execute(sql, params)}
+
+
+# ---------- 5. PAST FEEDBACK ----------
+def get_past_feedback(vehicle_id: str) -> Dict[str, Any]:
+    rows = _rows("SELECT data FROM past_feedback WHERE vehicle_id = ?", (vehicle_id,))
+    return rows[0] if rows else {}
+
+
+def store_feedback(record: Dict[str, Any]):
+    with get_pool().connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO past_feedback (vehicle_id, data) VALUES (?, ?)",
+            (record["vehicle_id"], json.dumps(record)),
+        )
+
+
+# ---------- 6. AGENT ACTIVITY LOGS ----------
+# Log and alert tables are append-only and the importer restarts their id
+# sequence, so a new row's id is the table's row count (no COUNT(*) scan).
+def _activity_row(record: Dict[str, Any]):
+    extra = record.get("extra") or {}
+    return (record.get("timestamp"), record.get("agent_name"), extra.get("vehicle_id"), json.dumps(record))
+
+
+def append_activity_log(record: Dict[str, Any]) -> int:
+    """Insert one log record; returns the record count (its row id, see above)."""
+    with get_pool().connection() as conn:
+        return conn.execute(
+            "INSERT INTO agent_activity_logs (timestamp, agent_name, vehicle_id, data) VALUES (?, ?, ?, ?)",
+            _activity_row(record),
+        ).lastrowid
+
+
+def read_activity_logs(since: Optional[str] = None,
+                       agent_name: Optional[str] = None,
+                       vehicle_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    sql = "SELECT data FROM agent_activity_logs WHERE 1 = 1"
+    params: List[Any] = []
+    if since:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    if agent_name:
+        sql += " AND agent_name = ?"
+        params.append(agent_name)
+    if vehicle_id:
+        sql += " AND vehicle_id = ?"
+        params.append(vehicle_id)
+    return _rows(sql + " ORDER BY id", params)
+
+
+# ---------- 7. UEBA ALERTS ----------
+def _alert_row(alert: Dict[str, Any]):
+    return (alert.get("alert_id"), alert.get("timestamp"), alert.get("agent_name"), json.dumps(alert))
+
+
+def append_alert(alert: Dict[str, Any]) -> int:
+    """Insert one alert; returns the alert count (its row id, see above)."""
+    with get_pool().connection() as conn:
+        return conn.execute(
+            "INSERT INTO ueba_alerts (alert_id, timestamp, agent_name, data) VALUES (?, ?, ?, ?)",
+            _alert_row(alert),
+        ).lastrowid
+
+
+def read_alerts() -> List[Dict[str, Any]]:
+    return _rows("SELECT data FROM ueba_alerts ORDER BY id")
+
+
+# ---------- One-shot importer ----------
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return default
+
+
+def _as_list(data) -> List[Dict[str, Any]]:
+    return data if isinstance(data, list) else [data]
+
+
+def import_json_datasets(data_dir: str = DATA_DIR, pool: Optional[ConnectionPool] = None) -> Dict[str, int]:
+    """
+    Load every data/*.json dataset into SQLite, replacing existing rows.
+    Returns the number of rows imported per table.
+    """
+    pool = pool or get_pool()
+    p = lambda name: os.path.join(data_dir, name)
+
+    profiles = _as_list(_read_json(p("vehicle_profiles.json"), []))
+    history = _as_list(_read_json(p("maintenance_history.json"), []))
+    telematics = _as_list(_read_json(p("live_telematics_feed.json"), []))
+    slots = _read_json(p("service_center_slots.json"), {})
+    feedback = _read_json(p("past_feedback.json"), {})
+    logs = _as_list(_read_json(p("agent_activity_logs.json"), []))
+    alerts = _as_list(_read_json(p("ueba_alerts.json"), []))
+
+    with pool.connection() as conn:
+        for table in ("vehicle_profiles", "maintenance_history", "telematics", "service_center_slots",
+                      "past_feedback", "agent_activity_logs", "ueba_alerts"):
+            conn.execute(f"DELETE FROM {table}")
+        # Append-only tables restart at id 1, keeping id == row count
+        conn.execute("DELETE FROM sqlite_sequence WHERE name IN ('agent_activity_logs', 'ueba_alerts')")
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO vehicle_profiles (vehicle_id, city, model, data) VALUES (?, ?, ?, ?)",
+            [(r["vehicle_id"], r.get("city"), r.get("model"), json.dumps(r)) for r in profiles if r.get("vehicle_id")],
+        )
+        conn.executemany(
+            "INSERT INTO maintenance_history (vehicle_id, date, data) VALUES (?, ?, ?)",
+            [(r["vehicle_id"], r.get("date"), json.dumps(r)) for r in history if r.get("vehicle_id")],
+        )
+        conn.executemany(
+            "INSERT INTO telematics (vehicle_id, timestamp, data) VALUES (?, ?, ?)",
+            [(r["vehicle_id"], r.get("timestamp"), json.dumps(r)) for r in telematics if r.get("vehicle_id")],
+        )
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO service_center_slots (center_id, city, location, data) VALUES (?, ?, ?, ?)",
+            [(cid, info.get("city"), info.get("location"), json.dumps(info)) for cid, info in slots.items()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO past_feedback (vehicle_id, data) VALUES (?, ?)",
+            [(vid, json.dumps(rec)) for vid, rec in feedback.items()],
+        )
+        conn.executemany(
+            "INSERT INTO agent_activity_logs (timestamp, agent_name, vehicle_id, data) VALUES (?, ?, ?, ?)",
+            [_activity_row(r) for r in logs if r],
+        )
+        conn.executemany(
+            "INSERT INTO ueba_alerts (alert_id, timestamp, agent_name, data) VALUES (?, ?, ?, ?)",
+            [_alert_row(a) for a in alerts if a],
+        )
+
+    return {
+        "vehicle_profiles": len(profiles),
+        "maintenance_history": len(history),
+        "telematics": len(telematics),
+        "service_center_slots": len(slots),
+        "past_feedback": len(feedback),
+        "agent_activity_logs": len(logs),
+        "ueba_alerts": len(alerts),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import data/*.json into SQLite")
+    parser.add_argument("--db", default=SQLITE_PATH)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    counts = import_json_datasets(args.data_dir, ConnectionPool(args.db))
+    for table, n in counts.items():
+        print(f"[sqlite_store] {table}: {n} rows")
@@ -0,0 +1,196 @@
+# shared/telematics_archive.py
+#
+# Long-retention telematics tier: one fixed-width binary column per signal,
+# rows grouped by vehicle and sorted by time, plus a manifest holding the
+# per-vehicle (offset, count) index. Readers open columns with numpy.memmap
+# so slicing one vehicle or one time window only touches those pages.
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .records import parse_timestamp
+
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+# Columns mirror webhook/telematics_generator.generate_telematics.
+# Float columns use NaN and integer columns use -1 for missing values.
+COLUMNS: Dict[str, str] = {
+    "timestamp_ms": "<i8",
+    "engine_temp_c": "<f4",
+    "rpm": "<i4",
+    "vehicle_speed_kmph": "<f4",
+    "battery_health_pct": "<f4",
+    "brake_pad_wear_pct": "<f4",
+    "oil_pressure_psi": "<f4",
+    "coolant_temp_c": "<f4",
+    "intake_air_temp_c": "<f4",
+    "fuel_efficiency_kmpl": "<f4",
+    "dtc_code": "S8",
+    "gps_lat": "<f8",
+    "gps_lon": "<f8",
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_ms(ts) -> int:
+    ts = parse_timestamp(ts)
+    if ts is None:
+        return -1
+    return int((ts - _EPOCH).total_seconds() * 1000)
+
+
+def _missing(dtype: str):
+    if dtype == "S8":
+        return b""
+    return np.nan if dtype.startswith("<f") else -1
+
+
+def _column_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.bin")
+
+
+# ---------- Writer ----------
+def write_archive(path: str, readings: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write readings (raw or normalized telematics dicts) to a columnar
+    archive directory, replacing any archive already there.
+    Returns the manifest.
+    """
+    by_vehicle: Dict[str, List[Dict[str, Any]]] = {}
+    for r in readings:
+        vid = r.get("vehicle_id")
+        if vid is not None:
+            by_vehicle.setdefault(vid, []).append(r)
+
+    rows = sum(len(v) for v in by_vehicle.values())
+    os.makedirs(path, exist_ok=True)
+
+    vehicles: Dict[str, List[int]] = {}
+    columns = {
+        name: np.memmap(_column_path(path, name) + ".tmp", dtype=dtype, mode="w+", shape=(max(rows, 1),))
+        for name, dtype in COLUMNS.items()
+    }
+
+    offset = 0
+    for vid in sorted(by_vehicle):
+        recs = sorted(by_vehicle[vid], key=lambda r: _to_ms(r.get("timestamp")))
+        n = len(recs)
+        block = slice(offset, offset + n)
+
+        columns["timestamp_ms"][block] = [_to_ms(r.get("timestamp")) for r in recs]
+        for name, dtype in COLUMNS.items():
+            if name in ("timestamp_ms", "dtc_code"):
+                continue
+            missing = _missing(dtype)
+            columns[name][block] = [
+                missing if r.get(name) is None else r[name] for r in recs
+            ]
+        columns["dtc_code"][block] = [
+            str(r.get("dtc_code") or "").encode("ascii", "ignore")[:8] for r in recs
+        ]
+
+        vehicles[vid] = [offset, n]
+        offset += n
+
+    for col in columns.values():
+        col.flush()
+    columns.clear()
+
+    for name in COLUMNS:
+        os.replace(_column_path(path, name) + ".tmp", _column_path(path, name))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "rows": rows,
+        "columns": COLUMNS,
+        "vehicles": vehicles,
+    }
+    tmp = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(path, MANIFEST_FILE))
+
+    return manifest
+
+
+# ---------- Reader ----------
+class TelematicsArchive:
+    """Read-only, memory-mapped view of an archive written by write_archive()."""
+
+    def __init__(self, path: str):
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"[telematics_archive] Manifest not found: {manifest_path}")
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"[telematics_archive] Unsupported format version: {manifest.get('format_version')}")
+
+        self.path = path
+        self.rows: int = manifest["rows"]
+        self.vehicles: Dict[str, List[int]] = manifest["vehicles"]
+        self._dtypes: Dict[str, str] = manifest["columns"]
+        self._columns: Dict[str, np.memmap] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        col = self._columns.get(name)
+        if col is None:
+            if name not in self._dtypes:
+                raise KeyError(f"[telematics_archive] Unknown column: {name}")
+            shape = (max(self.rows, 1),)
+            col = np.memmap(_column_path(self.path, name), dtype=self._dtypes[name], mode="r", shape=shape)
+            self._columns[name] = col
+        return col[:self.rows]
+
+    def _bounds(self, vehicle_id: str, start: Optional[datetime], end: Optional[datetime]):
+        offset, count = self.vehicles.get(vehicle_id, (0, 0))
+        lo, hi = offset, offset + count
+        if count and (start is not None or end is not None):
+            ts = self.column("timestamp_ms")[lo:hi]
+            if start is not None:
+                lo = offset + int(np.searchsorted(ts, _to_ms(start), side="left"))
+            if end is not None:
+                hi = offset + int(np.searchsorted(ts, _to_ms(end), side="right"))
+        return lo, hi
+
+    def vehicle(self, vehicle_id: str,
+                start: Optional[datetime] = None,
+                end: Optional[datetime] = None,
+                columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """Column slices for one vehicle, optionally limited to [start, end]."""
+        lo, hi = self._bounds(vehicle_id, start, end)
+        names = columns or list(self._dtypes)
+        return {name: self.column(name)[lo:hi] for name in names}
+
+    def window(self, start: Optional[datetime] = None,
+               end: Optional[datetime] = None,
+               columns: Optional[Sequence[str]] = None,
+               vehicle_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """Per-vehicle column slices for a time window across the fleet."""
+        result = {}
+        for vid in (vehicle_ids if vehicle_ids is not None else self.vehicles):
+            data = self.vehicle(vid, start, end, columns)
+            if len(next(iter(data.values()), ())):
+                result[vid] = data
+        return result
+
+
+if __name__ == "__main__":
+    # Build an archive from a JSON array of readings:
+    # python -m shared.telematics_archive data/live_telematics_feed.json data/telematics_archive
+    import sys
+
+    src, dest = sys.argv[1], sys.argv[2]
+    with open(src, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    m = write_archive(dest, data if isinstance(data, list) else [data])
+    print(f"[telematics_archive] Wrote {m['rows']} rows for {len(m['vehicles'])} vehicles to {dest}")
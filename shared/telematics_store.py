@@ -0,0 +1,193 @@
+# shared/telematics_store.py
+
+import copy
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .fleet_store import get_fleet_store
+from .records import TelematicsReading
+from .signal_stats import VehicleSignalStats
+
+
+TELEMATICS_FILE = "live_telematics_feed.json"
+
+# Readings kept per vehicle before the oldest one is evicted
+DEFAULT_CAPACITY = int(os.getenv("TELEMATICS_BUFFER_SIZE", "256"))
+
+
+def _sort_key(rec: TelematicsReading) -> datetime:
+    return rec.timestamp or datetime.min
+
+
+# ---------- Per-vehicle ring buffer ----------
+class _VehicleSeries:
+    __slots__ = ("readings", "latest", "stats")
+
+    def __init__(self, capacity: int):
+        self.readings: deque = deque(maxlen=capacity)
+        self.latest: Optional[TelematicsReading] = None
+        self.stats = VehicleSignalStats()
+
+    def add(self, rec: TelematicsReading) -> bool:
+        key = _sort_key(rec)
+        readings = self.readings
+
+        # Fast path: in-order arrival (the only case that moves the streaming stats)
+        if not readings or key > _sort_key(readings[-1]):
+            readings.append(rec)
+            self.latest = rec
+            self.stats.update(rec)
+            return True
+
+        ordered = list(readings)
+        i = bisect_left(ordered, key, key=_sort_key)
+
+        # Same timestamp already stored (e.g. feed file re-read)
+        if i < len(ordered) and _sort_key(ordered[i]) == key:
+            return False
+
+        if len(readings) == readings.maxlen:
+            # Older than everything we retain
+            if i == 0:
+                return False
+            readings.popleft()
+            i -= 1
+
+        readings.insert(i, rec)
+        return True
+
+    def window(self, start: Optional[datetime], end: Optional[datetime]) -> List[TelematicsReading]:
+        ordered = list(self.readings)
+        lo = bisect_left(ordered, start, key=_sort_key) if start else 0
+        hi = bisect_right(ordered, end, key=_sort_key) if end else len(ordered)
+        return ordered[lo:hi]
+
+
+class TelematicsStore:
+    """
+    In-memory telematics history: a bounded, time-ordered ring buffer of
+    readings per vehicle plus a pointer to the latest one.
+
+    Readings arrive through ingest() or from the live feed file, which is
+    re-read only when its mtime/size changes. subscribe() lets derived
+    state (e.g. rollups) see every stored reading.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, filename: str = TELEMATICS_FILE):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._series: Dict[str, _VehicleSeries] = {}
+        self._hooks: List[Callable[[TelematicsReading], None]] = []
+        self._source = get_fleet_store().dataset(filename, self._ingest_file) if filename else None
+
+    # ---- writes ----
+    def ingest(self, record: Dict[str, Any]) -> Optional[TelematicsReading]:
+        """Store one raw reading. Returns the normalized record, or None if it was dropped."""
+        if record.get("vehicle_id") is None:
+            return None
+
+        rec = record if isinstance(record, TelematicsReading) else TelematicsReading.from_raw(record)
+        vid = rec.vehicle_id
+        with self._lock:
+            series = self._series.get(vid)
+            if series is None:
+                series = self._series[vid] = _VehicleSeries(self.capacity)
+            stored = series.add(rec)
+            if stored:
+                for hook in self._hooks:
+                    hook(rec)
+
+        return rec if stored else None
+
+    def ingest_many(self, records: Iterable[Dict[str, Any]]) -> List[TelematicsReading]:
+        stored = []
+        for r in records:
+            rec = self.ingest(r)
+            if rec is not None:
+                stored.append(rec)
+        return stored
+
+    def subscribe(self, hook: Callable[[TelematicsReading], None], replay: bool = True):
+        """
+        Call hook(record) for every reading stored from now on (duplicates
+        are not passed on). With replay, readings already buffered are fed
+        to it first, atomically with the registration.
+        """
+        with self._lock:
+            if replay:
+                for series in self._series.values():
+                    for rec in series.readings:
+                        hook(rec)
+            self._hooks.append(hook)
+        return hook
+
+    def _ingest_file(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.ingest_many(records)
+        return {"records": len(records)}
+
+    def refresh(self):
+        """Pick up new readings from the feed file, if it changed."""
+        if self._source is None:
+            return
+        try:
+            self._source.index()
+        except FileNotFoundError:
+            pass
+
+    # ---- reads ----
+    def latest(self, vehicle_id: str) -> Optional[TelematicsReading]:
+        self.refresh()
+        series = self._series.get(vehicle_id)
+        return series.latest if series else None
+
+    def latest_many(self, vehicle_ids: Iterable[str]) -> Dict[str, Optional[TelematicsReading]]:
+        self.refresh()
+        result = {}
+        for vid in vehicle_ids:
+            series = self._series.get(vid)
+            result[vid] = series.latest if series else None
+        return result
+
+    def latest_all(self) -> Dict[str, TelematicsReading]:
+        self.refresh()
+        return {vid: s.latest for vid, s in list(self._series.items()) if s.latest is not None}
+
+    def window(self, vehicle_id: str,
+               start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> List[TelematicsReading]:
+        """Readings for one vehicle with start <= timestamp <= end, oldest first."""
+        self.refresh()
+        series = self._series.get(vehicle_id)
+        if series is None:
+            return []
+        with self._lock:
+            return series.window(start, end)
+
+    def signal_stats(self, vehicle_id: str) -> Optional[VehicleSignalStats]:
+        """Snapshot of the vehicle's streaming signal statistics (EWMA / variance / slope)."""
+        self.refresh()
+        series = self._series.get(vehicle_id)
+        if series is None:
+            return None
+        with self._lock:
+            return copy.deepcopy(series.stats)
+
+    def vehicle_ids(self) -> List[str]:
+        self.refresh()
+        return list(self._series.keys())
+
+
+_telematics_store = None
+
+
+def get_telematics_store() -> TelematicsStore:
+    global _telematics_store
+
+    if _telematics_store is None:
+        _telematics_store = TelematicsStore()
+
+    return _telematics_store
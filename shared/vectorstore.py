@@ -1,32 +1,408 @@
 # shared/vectorstore.py
 
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain.schema import Document
-from .shared_loader import load_capa_rca_docs
+from .index_modes import INDEX_MODE, calibrate_nprobe, compact_ids, mode_of, resolve_mode, search_params, train_index, tune
+from .query_cache import LRUCache
+from .shared_loader import load_capa_rca_docs, DATA_DIR
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+LIBRARY_PATH = os.path.join(DATA_DIR, "capa_rca_library.json")
+PERSIST_DIR = os.getenv(
+    "VECTORSTORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "vectorstore"),
+)
+MANIFEST_FILE = "manifest.json"
+
+# Query-side caches (size / TTL in seconds)
+CACHE_SIZE = int(os.getenv("CAPA_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.getenv("CAPA_CACHE_TTL", "3600"))
 
 _vectorstore = None
+_doc_hashes: Dict[str, str] = {}
+_lock = threading.Lock()
+_rebuild_hooks: List[Callable[[], None]] = []
+
+
+def on_rebuild(hook: Callable[[], None]):
+    """Register a callback run whenever the vectorstore is rebuilt (e.g. cache clears)."""
+    _rebuild_hooks.append(hook)
+    return hook
+
+
+def _notify_rebuild():
+    for hook in list(_rebuild_hooks):
+        hook()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Defers loading the embedding model until the first embed call, so a
+    persisted index can be opened without paying for the model load.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self.query_cache = LRUCache(CACHE_SIZE, CACHE_TTL, name="query_embeddings")
+
+    def _get(self) -> HuggingFaceEmbeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def embed_documents(self, texts):
+        return self._get().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.query_cache.get_or_compute(
+            normalize_query(text),
+            lambda: self._get().embed_query(text),
+        )
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        """Cached embed_query for many texts; all misses go through one batched forward pass."""
+        keys = [normalize_query(t) for t in texts]
+        vectors = [self.query_cache.get(k) for k in keys]
+
+        missing = {}
+        for i, (key, vec) in enumerate(zip(keys, vectors)):
+            if vec is None:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            first = [texts[idx[0]] for idx in missing.values()]
+            for (key, idx), vec in zip(missing.items(), self._get().embed_documents(first)):
+                self.query_cache.set(key, vec)
+                for i in idx:
+                    vectors[i] = vec
+
+        return vectors
+
+
+_embeddings = LazyEmbeddings()
+on_rebuild(_embeddings.query_cache.clear)
+
+
+def cache_stats() -> dict:
+    return _embeddings.query_cache.stats()
+
+
+def library_fingerprint(model_name: str = EMBEDDING_MODEL, index_mode: str = INDEX_MODE) -> str:
+    """Hash of capa_rca_library.json + embedding model + index mode; keys the persisted index."""
+    h = hashlib.sha256()
+    with open(LIBRARY_PATH, "rb") as f:
+        h.update(f.read())
+    h.update(model_name.encode("utf-8"))
+    h.update(index_mode.encode("utf-8"))
+    return h.hexdigest()
+
+
+# ---------- Persistence ----------
+def _read_manifest() -> Optional[dict]:
+    path = os.path.join(PERSIST_DIR, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(manifest: dict):
+    tmp = os.path.join(PERSIST_DIR, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(PERSIST_DIR, MANIFEST_FILE))
+
+
+def document_hash(doc: Document) -> str:
+    payload = json.dumps([doc.page_content, doc.metadata], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def save_vectorstore(vs: FAISS, fingerprint: str, doc_hashes: Dict[str, str]):
+    """
+    Write index.faiss / index.pkl (LangChain save_local layout) plus the
+    manifest. Each file is written to a temp name and swapped in with
+    os.replace, so a live index that has the old index.faiss mapped keeps
+    reading the old (now unlinked) file instead of one being rewritten.
+    """
+    os.makedirs(PERSIST_DIR, exist_ok=True)
+
+    # Drop the manifest first so a crash mid-write never leaves a
+    # manifest pointing at a mismatched index.
+    manifest_path = os.path.join(PERSIST_DIR, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    index_path = os.path.join(PERSIST_DIR, "index.faiss")
+    faiss.write_index(vs.index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+
+    pkl_path = os.path.join(PERSIST_DIR, "index.pkl")
+    with open(pkl_path + ".tmp", "wb") as f:
+        pickle.dump((vs.docstore, vs.index_to_docstore_id), f)
+    os.replace(pkl_path + ".tmp", pkl_path)
+
+    _write_manifest({
+        "fingerprint": fingerprint,
+        "embedding_model": EMBEDDING_MODEL,
+        "index_mode": INDEX_MODE,
+        "built_as": mode_of(vs.index),
+        "document_hashes": doc_hashes,
+    })
+
+
+def load_persisted_vectorstore(fingerprint: Optional[str] = None):
+    """
+    Open the saved index (memory-mapped for flat indexes). With a
+    fingerprint, only an index built from the same library + model + mode
+    is accepted; without one, any index built with the current model and
+    mode is (the caller is expected to sync it).
+    Returns (vectorstore, document_hashes) or None.
+    """
+    manifest = _read_manifest()
+    if not manifest or manifest.get("embedding_model") != EMBEDDING_MODEL:
+        return None
+    if manifest.get("index_mode", "flat") != INDEX_MODE:
+        return None
+    if fingerprint is not None and manifest.get("fingerprint") != fingerprint:
+        return None
 
+    # Compressed indexes are small and IVF lists must stay writable for sync
+    flags = faiss.IO_FLAG_MMAP_IFC if manifest.get("built_as", "flat") == "flat" else 0
 
+    try:
+        index = tune(faiss.read_index(os.path.join(PERSIST_DIR, "index.faiss"), flags))
+        with open(os.path.join(PERSIST_DIR, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    except Exception as e:
+        print(f"⚠ Persisted vectorstore unreadable ({e}); rebuilding.")
+        return None
+
+    vs = FAISS(
+        embedding_function=_embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    return vs, manifest.get("document_hashes", {})
+
+
+# ---------- Build / access ----------
 def build_vectorstore():
-    global _vectorstore
+    global _vectorstore, _doc_hashes
 
-    print("🔧 Building global FAISS vectorstore using MiniLM embeddings...")
+    print(f"🔧 Building global FAISS vectorstore ({INDEX_MODE}) using MiniLM embeddings...")
 
+    fingerprint = library_fingerprint()
     docs = load_capa_rca_docs()
+    doc_hashes = {d.metadata["id"]: document_hash(d) for d in docs}
+
+    texts = [d.page_content for d in docs]
+    vectors = np.asarray(_embeddings.embed_documents(texts), dtype=np.float32)
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
+    # Train the (possibly compressed) index, then add the already-computed vectors
+    index = train_index(resolve_mode(INDEX_MODE, len(vectors)), vectors)
+    vs = FAISS(
+        embedding_function=_embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
     )
+    vs.add_embeddings(
+        zip(texts, vectors.tolist()),
+        metadatas=[d.metadata for d in docs],
+        ids=list(doc_hashes),
+    )
+    calibrate_nprobe(vs.index, vectors)
+    save_vectorstore(vs, fingerprint, doc_hashes)
 
-    _vectorstore = FAISS.from_documents(docs, embeddings)
+    _vectorstore, _doc_hashes = vs, doc_hashes
+    _notify_rebuild()
     return _vectorstore
 
 
+def _writable_copy(vs: FAISS) -> FAISS:
+    """
+    Copy of vs that can be modified while readers keep using the original.
+    The index is round-tripped through serialize_index so the copy owns its
+    data: clone_index of a memory-mapped (persisted flat) index still views
+    the read-only mapping, and add / remove_ids on it abort.
+    """
+    return FAISS(
+        embedding_function=vs.embedding_function,
+        index=tune(faiss.deserialize_index(faiss.serialize_index(vs.index))),
+        docstore=InMemoryDocstore(dict(vs.docstore._dict)),
+        index_to_docstore_id=dict(vs.index_to_docstore_id),
+    )
+
+
+def _apply_sync(vs: FAISS, doc_hashes: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Diff the library against doc_hashes by CAPA id and content hash, embed
+    only new/changed entries and delete removed ones. Swaps the result in
+    as the global vectorstore and persists it. Caller holds _lock.
+    """
+    global _vectorstore, _doc_hashes
+
+    fingerprint = library_fingerprint()
+    docs = load_capa_rca_docs()
+    new_hashes = {d.metadata["id"]: document_hash(d) for d in docs}
+
+    removed = [i for i in doc_hashes if i not in new_hashes]
+    changed = [i for i in new_hashes if i in doc_hashes and doc_hashes[i] != new_hashes[i]]
+    added = [i for i in new_hashes if i not in doc_hashes]
+
+    summary = {"added": added, "changed": changed, "removed": removed}
+
+    if not (removed or changed or added):
+        _vectorstore, _doc_hashes = vs, doc_hashes
+        if fingerprint != (_read_manifest() or {}).get("fingerprint"):
+            # Byte-level change with identical documents (e.g. reformatting)
+            save_vectorstore(vs, fingerprint, new_hashes)
+            _doc_hashes = new_hashes
+        return summary
+
+    print(f"🔄 Syncing vectorstore: +{len(added)} ~{len(changed)} -{len(removed)}")
+
+    working = _writable_copy(vs)
+    stale = removed + changed
+    if stale:
+        stale_ids = set(stale)
+        stale_rows = [pos for pos, i in working.index_to_docstore_id.items() if i in stale_ids]
+        working.delete(stale)
+        compact_ids(working.index, stale_rows)
+
+    to_embed = set(added + changed)
+    fresh = [d for d in docs if d.metadata["id"] in to_embed]
+    if fresh:
+        working.add_documents(fresh, ids=[d.metadata["id"] for d in fresh])
+
+    save_vectorstore(working, fingerprint, new_hashes)
+    _vectorstore, _doc_hashes = working, new_hashes
+    _notify_rebuild()
+    return summary
+
+
+def sync_vectorstore() -> Dict[str, Any]:
+    """
+    Apply changes in capa_rca_library.json to the running vectorstore
+    without a full re-embed. Returns the ids added/changed/removed.
+    """
+    get_vectorstore()
+    with _lock:
+        return _apply_sync(_vectorstore, _doc_hashes)
+
+
 def get_vectorstore():
-    global _vectorstore
+    global _vectorstore, _doc_hashes
 
     if _vectorstore is None:
-        _vectorstore = build_vectorstore()
+        with _lock:
+            if _vectorstore is None:
+                loaded = load_persisted_vectorstore()
+                if loaded is None:
+                    return build_vectorstore()
+
+                vs, doc_hashes = loaded
+                if (_read_manifest() or {}).get("fingerprint") == library_fingerprint():
+                    print("⚡ Loaded persisted FAISS vectorstore.")
+                    _vectorstore, _doc_hashes = vs, doc_hashes
+                else:
+                    # Library changed since the index was saved: catch up incrementally
+                    _apply_sync(vs, doc_hashes)
 
     return _vectorstore
+
+
+# ---------- Batched / restricted search ----------
+def _embed_queries(vs: FAISS, queries: Sequence[str]) -> np.ndarray:
+    emb = vs.embedding_function
+
+    if isinstance(emb, LazyEmbeddings):
+        vectors = emb.embed_queries(queries)
+    elif isinstance(emb, Embeddings):
+        vectors = emb.embed_documents(list(queries))
+    else:
+        vectors = [emb(q) for q in queries]
+
+    x = np.asarray(vectors, dtype=np.float32)
+    if getattr(vs, "_normalize_L2", False):
+        faiss.normalize_L2(x)
+    return x
+
+
+def _to_documents(vs: FAISS, row) -> List[Document]:
+    docs = []
+    for i in row:
+        if i == -1:
+            continue
+        doc = vs.docstore.search(vs.index_to_docstore_id[int(i)])
+        if isinstance(doc, Document):
+            docs.append(doc)
+    return docs
+
+
+def search_many(queries: Sequence[str], k: int = 4, vectorstore: Optional[FAISS] = None) -> List[List[Document]]:
+    """
+    Batched similarity_search: embeds all queries in one forward pass and
+    runs a single FAISS search. Returns one Document list per query, in
+    the same order (and with the same results) as similarity_search.
+    """
+    if not queries:
+        return []
+
+    vs = vectorstore or get_vectorstore()
+    _, indices = vs.index.search(_embed_queries(vs, queries), k)
+    return [_to_documents(vs, row) for row in indices]
+
+
+_positions = (None, {})
+
+
+def _docstore_positions(vs: FAISS) -> Dict[str, int]:
+    """docstore id -> FAISS row, cached per vectorstore instance."""
+    global _positions
+
+    owner, positions = _positions
+    if owner is not vs:
+        positions = {doc_id: pos for pos, doc_id in vs.index_to_docstore_id.items()}
+        _positions = (vs, positions)
+    return positions
+
+
+def similarity_search_among(query: str, doc_ids: Sequence[str], k: int = 4,
+                            vectorstore: Optional[FAISS] = None) -> List[Document]:
+    """similarity_search restricted to the given docstore ids (FAISS IDSelector)."""
+    vs = vectorstore or get_vectorstore()
+    positions = _docstore_positions(vs)
+    rows = np.array([positions[i] for i in doc_ids if i in positions], dtype=np.int64)
+    if len(rows) == 0:
+        return []
+
+    params = search_params(vs.index, sel=faiss.IDSelectorBatch(rows))
+    _, indices = vs.index.search(_embed_queries(vs, [query]), min(k, len(rows)), params=params)
+    return _to_documents(vs, indices[0])
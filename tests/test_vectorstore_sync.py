@@ -0,0 +1,120 @@
+# tests/test_vectorstore_sync.py
+#
+# Incremental sync of a persisted CAPA vectorstore: build, restart (the
+# flat index is reopened memory-mapped), then add / change / remove
+# library entries.
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from shared import vectorstore
+from shared.shared_loader import capa_rca_documents
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic offline embeddings: a text always maps to the same vector."""
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(16).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def _entry(i, pattern=None):
+    return {
+        "id": f"RCA{i:03d}",
+        "failure_pattern": pattern or f"Failure pattern {i}",
+        "root_cause": f"Root cause {i}",
+        "capa": f"CAPA {i}",
+        "manufacturing_feedback": f"Feedback {i}",
+        "confidence": 0.5,
+        "related_dtc_codes": [],
+    }
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    path = tmp_path / "capa_rca_library.json"
+
+    def write(entries):
+        path.write_text(json.dumps(entries), encoding="utf-8")
+
+    monkeypatch.setattr(vectorstore, "PERSIST_DIR", str(tmp_path / "vectorstore"))
+    monkeypatch.setattr(vectorstore, "LIBRARY_PATH", str(path))
+    monkeypatch.setattr(vectorstore, "INDEX_MODE", "flat")
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings())
+    monkeypatch.setattr(
+        vectorstore, "load_capa_rca_docs",
+        lambda: capa_rca_documents(json.loads(path.read_text(encoding="utf-8"))),
+    )
+    monkeypatch.setattr(vectorstore, "_vectorstore", None)
+    monkeypatch.setattr(vectorstore, "_doc_hashes", {})
+    return write
+
+
+def _restart(monkeypatch):
+    monkeypatch.setattr(vectorstore, "_vectorstore", None)
+    monkeypatch.setattr(vectorstore, "_doc_hashes", {})
+
+
+def _ids(vs):
+    return sorted(vs.index_to_docstore_id.values())
+
+
+def _top_id(vs, text):
+    return vs.similarity_search(text, k=1)[0].metadata["id"]
+
+
+def test_sync_after_reload(library, monkeypatch):
+    entries = [_entry(i) for i in range(1, 6)]
+    library(entries)
+    vectorstore.get_vectorstore()
+
+    # Restart: the saved index is opened from disk, then the library changes
+    _restart(monkeypatch)
+    vs = vectorstore.get_vectorstore()
+    assert _ids(vs) == ["RCA001", "RCA002", "RCA003", "RCA004", "RCA005"]
+
+    entries = [e for e in entries if e["id"] != "RCA002"]
+    entries[0] = _entry(1, "Changed failure pattern")
+    entries.append(_entry(6))
+    library(entries)
+
+    summary = vectorstore.sync_vectorstore()
+    assert summary == {"added": ["RCA006"], "changed": ["RCA001"], "removed": ["RCA002"]}
+
+    vs = vectorstore.get_vectorstore()
+    assert vs.index.ntotal == 5
+    assert _ids(vs) == ["RCA001", "RCA003", "RCA004", "RCA005", "RCA006"]
+    for doc in vectorstore.load_capa_rca_docs():
+        assert _top_id(vs, doc.page_content) == doc.metadata["id"]
+
+
+def test_catch_up_on_startup(library, monkeypatch):
+    library([_entry(i) for i in range(1, 4)])
+    vectorstore.get_vectorstore()
+
+    # Library edited while the agent was down
+    _restart(monkeypatch)
+    library([_entry(1), _entry(3, "Changed failure pattern"), _entry(4)])
+    vs = vectorstore.get_vectorstore()
+
+    assert _ids(vs) == ["RCA001", "RCA003", "RCA004"]
+    assert vs.index.ntotal == 3
+
+    # The caught-up index was persisted and reopens without another sync
+    _restart(monkeypatch)
+    reloaded = vectorstore.get_vectorstore()
+    assert _ids(reloaded) == ["RCA001", "RCA003", "RCA004"]
+    np.testing.assert_array_equal(
+        reloaded.index.reconstruct_n(0, 3), vs.index.reconstruct_n(0, 3)
+    )
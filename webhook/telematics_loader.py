@@ -3,6 +3,7 @@
 import json
 import os
 import random
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "..", "data")
@@ -10,13 +11,20 @@ DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 TELEMETRICS_FILE = os.path.join(DATA_DIR, "live_telematics_feed.json")
 VEHICLE_PROFILES = os.path.join(DATA_DIR, "vehicle_profiles.json")
 
+# Add project root to PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "..")))
+
+from shared.telematics_store import get_telematics_store
+
 
 def load_telematics():
-    if not os.path.exists(TELEMETRICS_FILE):
+    """Latest reading per vehicle, served from the shared telematics store."""
+    latest = get_telematics_store().latest_all()
+
+    if not latest and not os.path.exists(TELEMETRICS_FILE):
         raise FileNotFoundError(f"{TELEMETRICS_FILE} not found")
 
-    with open(TELEMETRICS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return [rec.to_dict() for rec in latest.values()]
 
 
 def load_vehicle_profiles():
@@ -35,9 +43,6 @@ def get_random_vehicle():
     live_data = load_telematics()
     profiles = load_vehicle_profiles()
 
-    if isinstance(live_data, dict):
-        live_data = [live_data]
-
     random_entry = random.choice(live_data)
     vid = random_entry["vehicle_id"]
 
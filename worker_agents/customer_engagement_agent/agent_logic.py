@@ -6,6 +6,8 @@ from datetime import datetime
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
 
+from shared import sqlite_store
+
 UEBA_LOG_PATH = os.path.join("..", "..", "data", "agent_activity_logs.json")
 
 MODEL_NAME = "google/flan-t5-base"
@@ -56,7 +58,10 @@ def load_ueba_logs():
 # Extract latest diagnosis + analysis from UEBA logs
 # ---------------------------------------------------------
 def get_latest_agent_output(vehicle_id: str, agent_name: str):
-    logs = load_ueba_logs()
+    if sqlite_store.use_sqlite():
+        logs = sqlite_store.read_activity_logs(agent_name=agent_name, vehicle_id=vehicle_id)
+    else:
+        logs = load_ueba_logs()
 
     filtered = [
         entry for entry in logs
@@ -1,16 +1,21 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
+from shared.executors import install_busy_handler, run_in
+from shared.responses import FastJSONResponse
 from .agent_logic import generate_engagement
 
 app = FastAPI(
     title="Customer Engagement Agent (UEBA-powered)",
-    version="2.0"
+    version="2.0",
+    default_response_class=FastJSONResponse,
 )
+install_busy_handler(app)
 
 class EngagementRequest(BaseModel):
     vehicle_id: str
 
 
 @app.post("/engage")
-def engage(req: EngagementRequest):
-    return generate_engagement(req.vehicle_id)
+async def engage(req: EngagementRequest):
+    # flan-t5 generation: bounded "llm" pool (EXECUTOR_LLM_WORKERS)
+    return FastJSONResponse(await run_in("llm", generate_engagement, req.vehicle_id))
@@ -1,17 +1,26 @@
 # worker_agents/data_analysis/agent_logic.py
 
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
+
+from shared.records import parse_timestamp
+from shared.responses import loads as json_loads
+from shared.rule_engine import SEVERITY_RANK, get_rule_set
 from shared.shared_loader import (
+    aload_vehicle_bundle,
     load_telematics,
     load_vehicle_profile,
     load_maintenance_history,
+    load_fleet_risk,
 )
+from shared.telematics_store import get_telematics_store
+from worker_agents.data_analysis.alert_state import ALERT_DEDUP, get_alert_tracker
 
 
 def detect_raw_anomalies(telematics: Dict[str, Any]):
     """
-    Simple rule-based anomaly detector.
+    Simple rule-based anomaly detector (thresholds in shared/rules.json).
     Works even if some fields are missing.
     """
     anomalies = []
@@ -24,50 +33,32 @@ def detect_raw_anomalies(telematics: Dict[str, Any]):
         })
         return anomalies
 
-    engine_temp = telematics.get("engine_temp_c", 0)
-    brake_wear = telematics.get("brake_pad_wear_pct", 100)
-    battery_health = telematics.get("battery_health_pct", 100)
-    oil_pressure = telematics.get("oil_pressure_psi", 100)
-
-    # Engine temperature rules
-    if engine_temp > 100:
-        anomalies.append({
-            "component": "engine",
-            "type": "overheating",
-            "severity": "high"
-        })
-    elif engine_temp > 85:
-        anomalies.append({
-            "component": "engine",
-            "type": "elevated_temperature",
-            "severity": "medium"
-        })
+    anomalies.extend(get_rule_set("data_analysis").evaluate(telematics))
+    return anomalies
 
-    # Brake pad wear
-    if brake_wear < 20:
-        anomalies.append({
-            "component": "brake_system",
-            "type": "brake_pad_thin",
-            "severity": "medium"
-        })
 
-    # Battery health
-    if battery_health < 40:
-        anomalies.append({
-            "component": "battery",
-            "type": "battery_health_low",
-            "severity": "high"
-        })
+def detect_raw_anomalies_many(readings: Sequence[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    detect_raw_anomalies for many readings; the threshold rules run as one
+    vectorized pass over the whole batch.
+    """
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(readings)
+    present = []
+    for i, t in enumerate(readings):
+        if not isinstance(t, dict) or not t.get("exists", True):
+            results[i] = [{
+                "component": "system",
+                "type": "no_telematics_data",
+                "severity": "high"
+            }]
+        else:
+            present.append(i)
 
-    # Oil pressure
-    if oil_pressure < 25:
-        anomalies.append({
-            "component": "engine",
-            "type": "low_oil_pressure",
-            "severity": "high"
-        })
+    alerts = get_rule_set("data_analysis").evaluate_many([readings[i] for i in present])
+    for i, a in zip(present, alerts):
+        results[i] = a
 
-    return anomalies
+    return results
 
 
 def analyze_vehicle_telematics(vehicle_id: str) -> Dict[str, Any]:
@@ -81,15 +72,310 @@ def analyze_vehicle_telematics(vehicle_id: str) -> Dict[str, Any]:
     profile = load_vehicle_profile(vehicle_id)
     history = load_maintenance_history(vehicle_id)
 
-    # 2) Detect anomalies
-    alerts = detect_raw_anomalies(tele)
+    return _analysis_result(vehicle_id, tele, profile, history)
+
+
+async def analyze_vehicle_telematics_async(vehicle_id: str) -> Dict[str, Any]:
+    """analyze_vehicle_telematics with the three loads run concurrently on the io pool."""
+    profile, tele, history = await aload_vehicle_bundle(vehicle_id)
+    return _analysis_result(vehicle_id, tele, profile, history)
+
 
-    # 3) Build response (clean_json in main.py will make datetimes serializable)
+def debounce_alerts(vehicle_id: str, alerts: List[Dict[str, Any]],
+                    tele: Dict[str, Any], channel: str) -> Dict[str, Any]:
+    """
+    Keep only newly raised / escalated alerts in "alerts"; alerts that are
+    merely still active go to "ongoing_alerts" (see alert_state.py).
+    """
+    if not ALERT_DEDUP:
+        return {"alerts": alerts, "alerts_ongoing": False, "ongoing_alerts": [], "resolved_alerts": []}
+
+    state = get_alert_tracker(channel).update(vehicle_id, alerts, tele)
+    return {
+        "alerts": state["raised"],
+        "alerts_ongoing": bool(state["ongoing"]),
+        "ongoing_alerts": state["ongoing"],
+        "resolved_alerts": state["resolved"],
+    }
+
+
+def _analysis_result(vehicle_id, tele, profile, history) -> Dict[str, Any]:
+    # 2) Detect anomalies, reporting each one once per episode
+    alerts = debounce_alerts(vehicle_id, detect_raw_anomalies(tele), tele, "analyze")
+
+    # 3) Build response (FastJSONResponse in main.py serializes datetimes)
     return {
         "vehicle_id": vehicle_id,
         "telematics_found": tele.get("exists", False),
         "vehicle_profile_found": profile.get("exists", False),
         "maintenance_records": len(history),
-        "alerts": alerts,
+        **alerts,
         "raw_telematics": tele,
     }
+
+
+def rank_fleet_risk(k: int = 10,
+                    city: Optional[str] = None,
+                    model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Top-K highest-risk vehicles across the fleet.
+    Used for proactive outreach.
+    """
+    table = load_fleet_risk()
+    vehicles = table.top_k(k, city=city, model=model)
+
+    return {
+        "fleet_size": len(table),
+        "k": k,
+        "filters": {"city": city, "model": model},
+        "vehicles": vehicles,
+    }
+
+
+# ============================================================
+# FLEET SWEEP (every vehicle's latest reading in one pass)
+# ============================================================
+
+_SEVERITY_NAMES = {rank: name for name, rank in SEVERITY_RANK.items()}
+
+NO_TELEMATICS_ALERT = {
+    "component": "system",
+    "type": "no_telematics_data",
+    "severity": "high"
+}
+
+
+class FleetSweep:
+    """
+    Anomaly rules evaluated over the whole fleet at once. Rows are ordered
+    most severe first (fleet order within a severity); alert dicts are
+    only built for the rows a page actually returns.
+    """
+
+    def __init__(self, vehicle_ids, city, model, readings, fired, severity, counts, filters):
+        self.vehicle_ids = vehicle_ids
+        self.city = city
+        self.model = model
+        self.readings = readings
+        self.fired = fired
+        self.severity = severity
+        self.counts = counts
+        self.filters = filters
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def rows(self, offset: int = 0, limit: Optional[int] = None,
+             include_telematics: bool = False) -> List[Dict[str, Any]]:
+        rule_set = get_rule_set("data_analysis")
+        stop = len(self) if limit is None else min(len(self), offset + limit)
+        out = []
+        for i in range(offset, stop):
+            rec = self.readings[i]
+            if rec is None:
+                alerts = [dict(NO_TELEMATICS_ALERT)]
+            else:
+                alerts = rule_set.alerts_for(self.fired[i])
+            row = {
+                "vehicle_id": self.vehicle_ids[i],
+                "city": self.city[i],
+                "model": self.model[i],
+                "timestamp": rec.timestamp if rec is not None else None,
+                "severity": _SEVERITY_NAMES.get(int(self.severity[i])),
+                "alerts": alerts,
+            }
+            if include_telematics:
+                row["raw_telematics"] = rec.to_dict() if rec is not None else {"exists": False}
+            out.append(row)
+        return out
+
+    def page(self, offset: int, limit: int, include_telematics: bool = False) -> Dict[str, Any]:
+        next_offset = offset + limit
+        return {
+            **self.summary(),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset if next_offset < len(self) else None,
+            "vehicles": self.rows(offset, limit, include_telematics),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "filters": self.filters,
+            "severity_counts": self.counts,
+            "total": len(self),
+        }
+
+
+def sweep_fleet(city: Optional[str] = None,
+                model: Optional[str] = None,
+                severity: Optional[str] = None,
+                flagged_only: bool = True) -> FleetSweep:
+    """
+    Run the data_analysis rules over every vehicle's latest telematics as
+    one vectorized pass. city / model filter on the vehicle profile;
+    severity keeps vehicles whose worst alert is at least that severe.
+    """
+    if severity is not None and severity not in SEVERITY_RANK:
+        raise ValueError(f"severity must be one of {sorted(SEVERITY_RANK)}")
+
+    table = load_fleet_risk()
+    latest = get_telematics_store().latest_all()
+
+    mask = table.filter_mask(city, model)
+    vehicle_ids = table.vehicle_ids[mask].tolist()
+    cities = table.city[mask].tolist()
+    models = table.model[mask].tolist()
+
+    # Vehicles reporting telematics without a profile only match an unfiltered sweep
+    if not city and not model:
+        known = set(table.vehicle_ids.tolist())
+        extra = [vid for vid in latest if vid not in known]
+        vehicle_ids.extend(extra)
+        cities.extend([None] * len(extra))
+        models.extend([None] * len(extra))
+
+    rule_set = get_rule_set("data_analysis")
+    readings = [latest.get(vid) for vid in vehicle_ids]
+    present = np.array([rec is not None for rec in readings], dtype=bool)
+
+    fired = np.zeros((len(vehicle_ids), len(rule_set)), dtype=bool)
+    if present.any():
+        records = [rec for rec in readings if rec is not None]
+        fired[present] = rule_set.evaluate_matrix(rule_set.columns(records))
+
+    # Worst severity per vehicle (0 = no alerts); missing telematics counts as high
+    ranks = np.array([SEVERITY_RANK.get(r["severity"], 0) for r in rule_set.rules], dtype=np.int8)
+    worst = (fired * ranks).max(axis=1) if len(rule_set) else np.zeros(len(vehicle_ids), dtype=np.int8)
+    worst = np.where(present, worst, SEVERITY_RANK["high"])
+
+    counts = {name: int((worst == rank).sum()) for name, rank in SEVERITY_RANK.items()}
+    counts["ok"] = int((worst == 0).sum())
+
+    keep = worst >= (SEVERITY_RANK[severity] if severity else (1 if flagged_only else 0))
+    rows = np.flatnonzero(keep)
+    rows = rows[np.argsort(-worst[rows], kind="stable")].tolist()
+
+    return FleetSweep(
+        vehicle_ids=[vehicle_ids[i] for i in rows],
+        city=[cities[i] for i in rows],
+        model=[models[i] for i in rows],
+        readings=[readings[i] for i in rows],
+        fired=fired[rows],
+        severity=worst[rows],
+        counts=counts,
+        filters={"city": city, "model": model, "severity": severity, "flagged_only": flagged_only},
+    )
+
+
+# ============================================================
+# STREAMING INGEST (readings pushed by n8n / gateways)
+# ============================================================
+
+NUMERIC_FIELDS = (
+    "engine_temp_c", "rpm", "vehicle_speed_kmph", "battery_health_pct",
+    "brake_pad_wear_pct", "oil_pressure_psi", "coolant_temp_c",
+    "intake_air_temp_c", "fuel_efficiency_kmpl", "gps_lat", "gps_lon",
+)
+
+
+def parse_ingest_body(body: bytes, ndjson: bool = False) -> Tuple[List[Tuple[int, Any]], List[Dict[str, Any]]]:
+    """
+    Split a request body into (index, record) pairs. Accepts a JSON array,
+    a single JSON object, or NDJSON (one object per line). Bad NDJSON lines
+    are returned as rejections; a malformed JSON document raises ValueError.
+    """
+    if not ndjson:
+        try:
+            data = json_loads(body)
+        except ValueError:
+            if b"\n" not in body.strip():
+                raise
+            ndjson = True
+        else:
+            items = data if isinstance(data, list) else [data]
+            return list(enumerate(items)), []
+
+    records, rejected = [], []
+    for i, line in enumerate(body.splitlines()):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append((i, json_loads(line)))
+        except ValueError as e:
+            rejected.append({"index": i, "error": f"invalid JSON: {e}"})
+    return records, rejected
+
+
+def validate_reading(raw: Any) -> Optional[str]:
+    """Error message for an unusable reading, or None."""
+    if not isinstance(raw, dict):
+        return "reading must be a JSON object"
+    vid = raw.get("vehicle_id")
+    if not isinstance(vid, str) or not vid.strip():
+        return "vehicle_id is required"
+    if parse_timestamp(raw.get("timestamp")) is None:
+        return "timestamp must be an ISO-8601 string"
+    for field in NUMERIC_FIELDS:
+        v = raw.get(field)
+        if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float))):
+            return f"{field} must be a number"
+    return None
+
+
+def ingest_readings(records: Sequence[Tuple[int, Any]]) -> Dict[str, Any]:
+    """
+    Validate and store a batch of readings, then run the anomaly rules on
+    every vehicle whose latest reading arrived in this batch. Only vehicles
+    with newly raised or escalated alerts are returned.
+    """
+    store = get_telematics_store()
+    rejected: List[Dict[str, Any]] = []
+    stored = {}
+    duplicates = 0
+
+    for i, raw in records:
+        error = validate_reading(raw)
+        if error:
+            rejected.append({"index": i, "error": error})
+            continue
+        rec = store.ingest(raw)
+        if rec is None:
+            duplicates += 1
+        else:
+            stored[id(rec)] = rec
+
+    # Vehicles whose newest reading is one of ours (late arrivals don't change state)
+    vids = list(dict.fromkeys(rec.vehicle_id for rec in stored.values()))
+    latest = store.latest_many(vids)
+    fresh = [latest[vid] for vid in vids if id(latest[vid]) in stored]
+
+    readings = [rec.to_dict() for rec in fresh]
+    flagged = []
+    ongoing = 0
+    for tele, alerts in zip(readings, detect_raw_anomalies_many(readings)):
+        state = debounce_alerts(tele["vehicle_id"], alerts, tele, "ingest")
+        ongoing += state["alerts_ongoing"]
+        if state["alerts"]:
+            flagged.append({
+                "vehicle_id": tele["vehicle_id"],
+                "timestamp": tele.get("timestamp"),
+                **state,
+                "raw_telematics": tele,
+            })
+
+    return {
+        "accepted": len(stored),
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "vehicles_evaluated": len(fresh),
+        "vehicles_with_alerts": len(flagged),
+        "vehicles_with_ongoing_alerts": ongoing,
+        "alerts": flagged,
+    }
+
+
+def chunked(records: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(records), size):
+        yield records[start:start + size]
@@ -0,0 +1,205 @@
+# worker_agents/data_analysis/alert_state.py
+#
+# Per-vehicle alert state, so a sustained fault is reported once instead of
+# on every reading.
+#
+# An alert is keyed by its rule group (e.g. "engine_temp") or its
+# component/type. Once raised it stays active until the signal recovers
+# past the rule threshold by its "hysteresis" margin (shared/rules.json).
+# An alert that clears and comes back within its cool-down
+# (ALERT_COOLDOWN_SECONDS, or the rule's "cooldown_seconds") belongs to the
+# same episode and is not raised again. Only a higher severity than the
+# one already reported (an escalation) breaks through.
+#
+# Each consumer (/analyze polling, /ingest pushes) has its own tracker, so
+# one consumer seeing an alert does not hide it from the other.
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from shared.records import parse_timestamp
+from shared.rule_engine import SEVERITY_RANK, get_rule_set
+
+
+ALERT_DEDUP = os.getenv("ALERT_DEDUP", "1") != "0"
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", "1800"))
+
+
+class _AlertState:
+    __slots__ = ("alert", "rule", "active", "since", "cleared_at", "notified_rank")
+
+    def __init__(self, alert: Dict[str, Any], rule: Optional[int], now: datetime):
+        self.alert = alert
+        self.rule = rule
+        self.active = True
+        self.since = now
+        self.cleared_at: Optional[datetime] = None
+        self.notified_rank = 0
+
+
+def _utcnow() -> datetime:
+    """Naive UTC, the same clock as parsed reading timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class AlertStateTracker:
+    """
+    Debounces alerts per vehicle. update() splits the current alerts into
+    raised (new / escalated, to act on), ongoing and resolved.
+    """
+
+    def __init__(self, rule_set: str = "data_analysis",
+                 cooldown_seconds: float = ALERT_COOLDOWN_SECONDS):
+        self.rule_set_name = rule_set
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._vehicles: Dict[str, Dict[Any, _AlertState]] = {}
+        self._updated_at: Dict[str, datetime] = {}
+
+    def _rule_index(self, rule_set, alert: Dict[str, Any]) -> Optional[int]:
+        for i, r in enumerate(rule_set.rules):
+            if r["component"] == alert.get("component") and r["type"] == alert.get(rule_set.label_key):
+                return i
+        return None
+
+    def _key(self, rule_set, alert: Dict[str, Any], rule: Optional[int]):
+        if rule is not None and rule_set.rules[rule].get("group"):
+            return rule_set.rules[rule]["group"]
+        return (alert.get("component"), alert.get(rule_set.label_key))
+
+    def _cooldown(self, rule_set, rule: Optional[int]) -> float:
+        if rule is None:
+            return self.cooldown_seconds
+        return float(rule_set.rules[rule].get("cooldown_seconds", self.cooldown_seconds))
+
+    def _holds(self, rule_set, reading, rule: Optional[int]) -> bool:
+        """Active alert still inside its hysteresis band."""
+        if rule is None or not isinstance(reading, dict) or not reading.get("exists", True):
+            return False
+        margin = float(rule_set.rules[rule].get("hysteresis", 0))
+        return margin > 0 and rule_set.still_firing(reading, rule, margin)
+
+    def _same_episode(self, rule_set, st: _AlertState, ts: datetime) -> bool:
+        """Whether a cleared alert seen at ts falls within its episode, cool-down included."""
+        cooldown = timedelta(seconds=self._cooldown(rule_set, st.rule))
+        return st.since - cooldown <= ts <= st.cleared_at + cooldown
+
+    def update(self, vehicle_id: str, alerts: Sequence[Dict[str, Any]],
+               reading: Optional[Dict[str, Any]] = None,
+               now: Optional[datetime] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fold one evaluation into the vehicle's state. now defaults to the
+        reading's timestamp (UTC wall clock when the reading has none, which
+        then does not move the vehicle's clock). A reading older than the
+        last one seen does not change existing alert state; an alert only
+        it raises is recorded as an episode already over.
+        """
+        reading = reading or {}
+        reading_ts = now or parse_timestamp(reading.get("timestamp"))
+        now = reading_ts or _utcnow()
+        rule_set = get_rule_set(self.rule_set_name)
+
+        current = {}
+        for alert in alerts:
+            rule = self._rule_index(rule_set, alert)
+            current[self._key(rule_set, alert, rule)] = (alert, rule)
+
+        raised, ongoing, resolved = [], [], []
+
+        with self._lock:
+            states = self._vehicles.setdefault(vehicle_id, {})
+            last = self._updated_at.get(vehicle_id)
+            if reading_ts is not None and last is not None and reading_ts < last:
+                # Late reading: the newer state stands and is not changed.
+                # Alerts of a known episode (active, or cleared within its
+                # cool-down) were already reported; only others are raised.
+                for key, (alert, rule) in current.items():
+                    st = states.get(key)
+                    if st is not None and st.active:
+                        ongoing.append({**alert, "status": "ongoing", "since": st.since})
+                    elif st is not None and self._same_episode(rule_set, st, now):
+                        continue
+                    else:
+                        raised.append({**alert, "status": "new"})
+                        if st is None:
+                            # Past episode: already over as of the newest reading
+                            st = states[key] = _AlertState(alert, rule, now)
+                            st.active = False
+                            st.cleared_at = last
+                            st.notified_rank = SEVERITY_RANK.get(alert.get("severity"), 0)
+                return {"raised": raised, "ongoing": ongoing, "resolved": resolved}
+            if reading_ts is not None:
+                self._updated_at[vehicle_id] = reading_ts
+
+            for key, (alert, rule) in current.items():
+                rank = SEVERITY_RANK.get(alert.get("severity"), 0)
+                st = states.get(key)
+
+                if st is None or (
+                    not st.active
+                    and (now - st.cleared_at).total_seconds() >= self._cooldown(rule_set, st.rule)
+                ):
+                    st = states[key] = _AlertState(alert, rule, now)
+                    st.notified_rank = rank
+                    raised.append({**alert, "status": "new"})
+                    continue
+
+                if not st.active:
+                    # Back within the cool-down: same episode
+                    st.active = True
+                    st.cleared_at = None
+
+                held_rank = SEVERITY_RANK.get(st.alert.get("severity"), 0)
+                if rank < held_rank and self._holds(rule_set, reading, st.rule):
+                    # De-escalation not yet past the hysteresis band
+                    alert, rule = st.alert, st.rule
+                else:
+                    st.alert, st.rule = alert, rule
+
+                if rank > st.notified_rank:
+                    st.notified_rank = rank
+                    raised.append({**alert, "status": "escalated", "since": st.since})
+                else:
+                    ongoing.append({**alert, "status": "ongoing", "since": st.since})
+
+            for key, st in states.items():
+                if key in current or not st.active:
+                    continue
+                if self._holds(rule_set, reading, st.rule):
+                    ongoing.append({**st.alert, "status": "ongoing", "since": st.since})
+                else:
+                    st.active = False
+                    st.cleared_at = now
+                    resolved.append({**st.alert, "status": "resolved", "since": st.since})
+
+        return {"raised": raised, "ongoing": ongoing, "resolved": resolved}
+
+    def active(self, vehicle_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {**st.alert, "since": st.since}
+                for st in self._vehicles.get(vehicle_id, {}).values() if st.active
+            ]
+
+    def reset(self, vehicle_id: Optional[str] = None):
+        with self._lock:
+            if vehicle_id is None:
+                self._vehicles.clear()
+                self._updated_at.clear()
+            else:
+                self._vehicles.pop(vehicle_id, None)
+                self._updated_at.pop(vehicle_id, None)
+
+
+_trackers: Dict[str, AlertStateTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_alert_tracker(channel: str = "analyze") -> AlertStateTracker:
+    tracker = _trackers.get(channel)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(channel, AlertStateTracker())
+    return tracker
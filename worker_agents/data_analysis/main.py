@@ -1,24 +1,30 @@
-from fastapi import FastAPI, Query
+import os
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
-from worker_agents.data_analysis.agent_logic import analyze_vehicle_telematics
-from datetime import datetime
-
-
+from shared.executors import install_busy_handler, run_io
+from shared.responses import FastJSONResponse, dumps
+from worker_agents.data_analysis.agent_logic import (
+    analyze_vehicle_telematics_async,
+    chunked,
+    ingest_readings,
+    parse_ingest_body,
+    rank_fleet_risk,
+    sweep_fleet,
+)
+from worker_agents.data_analysis.rollups import get_rollups, parse_window_bound
 
-# ============================================================
-# JSON CLEANER (reuse same as in tools)
-# ============================================================
+# Readings per /ingest request, and per evaluation chunk when streaming
+INGEST_MAX_RECORDS = int(os.getenv("INGEST_MAX_RECORDS", "100000"))
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
 
-def clean_json(obj):
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    if isinstance(obj, dict):
-        return {k: clean_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [clean_json(i) for i in obj]
-    return obj
+# Vehicles per /analyze/fleet page
+FLEET_PAGE_DEFAULT = int(os.getenv("FLEET_PAGE_DEFAULT", "500"))
+FLEET_PAGE_MAX = int(os.getenv("FLEET_PAGE_MAX", "10000"))
 
 
 # ============================================================
@@ -28,9 +34,15 @@ def clean_json(obj):
 app = FastAPI(
     title="Data Analysis Agent",
     description="Real-time Vehicle Telematics Processor",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
+install_busy_handler(app)
+
+# Start rolling up readings as soon as the agent loads
+get_rollups()
+
 # Optional - Allow n8n + Cloudflare to call API
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +60,17 @@ class AnalyzeRequest(BaseModel):
     vehicle_id: str
 
 
+class FleetSweepRequest(BaseModel):
+    city: Optional[str] = None
+    model: Optional[str] = None
+    severity: Optional[str] = None
+    flagged_only: bool = True
+    include_telematics: bool = False
+    offset: int = 0
+    limit: int = FLEET_PAGE_DEFAULT
+    stream: bool = False
+
+
 # ============================================================
 # ROOT ENDPOINT (Health Check)
 # ============================================================
@@ -58,8 +81,13 @@ def root():
         "message": "Data Analysis Agent active",
         "status": "running",
         "endpoints": {
-            "POST": "/analyze",
-            "GET": "/analyze?vehicle_id=<id>"
+            "POST": ["/analyze", "/analyze/fleet", "/ingest"],
+            "GET": [
+                "/analyze?vehicle_id=<id>",
+                "/analyze/fleet?city=<city>&model=<model>&severity=<low|medium|high>&offset=<n>&limit=<n>",
+                "/risk/top?k=<n>&city=<city>&model=<model>",
+                "/rollups?vehicle_id=<id>&start=<iso>&end=<iso>&signals=<a,b>&resolution=<1m|1h|1d>"
+            ]
         }
     }
 
@@ -69,11 +97,11 @@ def root():
 # ============================================================
 
 @app.post("/analyze")
-def analyze_post(req: AnalyzeRequest):
+async def analyze_post(req: AnalyzeRequest):
     vehicle_id = req.vehicle_id.strip()
 
-    result = analyze_vehicle_telematics(vehicle_id)
-    return clean_json(result)
+    result = await analyze_vehicle_telematics_async(vehicle_id)
+    return FastJSONResponse(result)
 
 
 # ============================================================
@@ -81,12 +109,155 @@ def analyze_post(req: AnalyzeRequest):
 # ============================================================
 
 @app.get("/analyze")
-def analyze_get(vehicle_id: str = Query(..., description="Vehicle ID to analyze")):
+async def analyze_get(vehicle_id: str = Query(..., description="Vehicle ID to analyze")):
 
     vehicle_id = vehicle_id.strip()
 
-    result = analyze_vehicle_telematics(vehicle_id)
-    return clean_json(result)
+    result = await analyze_vehicle_telematics_async(vehicle_id)
+    return FastJSONResponse(result)
+
+
+# ============================================================
+# FLEET SWEEP (all vehicles, one vectorized pass)
+# ============================================================
+
+async def _fleet_sweep(req: FleetSweepRequest):
+    if req.offset < 0 or not 1 <= req.limit <= FLEET_PAGE_MAX:
+        raise HTTPException(
+            status_code=422,
+            detail=f"offset must be >= 0 and limit between 1 and {FLEET_PAGE_MAX}."
+        )
+    try:
+        sweep = await run_io(sweep_fleet, req.city, req.model, req.severity, req.flagged_only)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if not req.stream:
+        return FastJSONResponse(await run_io(sweep.page, req.offset, req.limit, req.include_telematics))
+
+    async def vehicle_lines():
+        stop = min(len(sweep), req.offset + req.limit)
+        for start in range(req.offset, stop, INGEST_CHUNK_SIZE):
+            rows = await run_io(sweep.rows, start, min(INGEST_CHUNK_SIZE, stop - start), req.include_telematics)
+            for row in rows:
+                yield dumps(row) + b"\n"
+        next_offset = req.offset + req.limit
+        yield dumps({"summary": {
+            **sweep.summary(),
+            "offset": req.offset,
+            "limit": req.limit,
+            "next_offset": next_offset if next_offset < len(sweep) else None,
+        }}) + b"\n"
+
+    return StreamingResponse(vehicle_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/analyze/fleet")
+async def analyze_fleet_post(req: FleetSweepRequest):
+    return await _fleet_sweep(req)
+
+
+@app.get("/analyze/fleet")
+async def analyze_fleet_get(
+    city: Optional[str] = Query(None, description="Filter by city"),
+    model: Optional[str] = Query(None, description="Filter by vehicle model"),
+    severity: Optional[str] = Query(None, description="Minimum alert severity: low, medium or high"),
+    flagged_only: bool = Query(True, description="Only vehicles with at least one alert"),
+    include_telematics: bool = Query(False, description="Include each vehicle's latest reading"),
+    offset: int = Query(0, description="Index of the first vehicle to return"),
+    limit: int = Query(FLEET_PAGE_DEFAULT, description="Vehicles per page"),
+    stream: bool = Query(False, description="Stream vehicles as NDJSON"),
+):
+    return await _fleet_sweep(FleetSweepRequest(
+        city=city, model=model, severity=severity, flagged_only=flagged_only,
+        include_telematics=include_telematics, offset=offset, limit=limit, stream=stream,
+    ))
+
+
+# ============================================================
+# STREAMING INGEST (JSON array or NDJSON batches)
+# ============================================================
+
+@app.post("/ingest")
+async def ingest(request: Request, stream: bool = Query(False, description="Stream flagged vehicles as NDJSON")):
+    """
+    Push telematics readings straight into the agent. Each reading updates
+    the vehicle's in-memory state and is checked by the anomaly rules on
+    arrival; only vehicles with newly raised or escalated alerts come back.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+
+    try:
+        records, rejected = await run_io(parse_ingest_body, body, ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Body is neither JSON nor NDJSON: {e}")
+
+    if len(records) > INGEST_MAX_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {INGEST_MAX_RECORDS} readings per request (got {len(records)})."
+        )
+
+    if not stream:
+        result = await run_io(ingest_readings, records)
+        result["rejected"] = rejected + result["rejected"]
+        return FastJSONResponse(result)
+
+    async def flagged_lines():
+        totals = {"accepted": 0, "duplicates": 0, "vehicles_evaluated": 0,
+                  "vehicles_with_alerts": 0, "vehicles_with_ongoing_alerts": 0}
+        all_rejected = list(rejected)
+        for chunk in chunked(records, INGEST_CHUNK_SIZE):
+            result = await run_io(ingest_readings, chunk)
+            for key in totals:
+                totals[key] += result[key]
+            all_rejected.extend(result["rejected"])
+            for item in result["alerts"]:
+                yield dumps(item) + b"\n"
+        yield dumps({"summary": {**totals, "rejected": all_rejected}}) + b"\n"
+
+    return StreamingResponse(flagged_lines(), media_type="application/x-ndjson")
+
+
+# ============================================================
+# FLEET RISK RANKING (Proactive outreach)
+# ============================================================
+
+@app.get("/risk/top")
+async def risk_top(
+    k: int = Query(10, ge=1, le=100000, description="Number of vehicles to return"),
+    city: Optional[str] = Query(None, description="Filter by city"),
+    model: Optional[str] = Query(None, description="Filter by vehicle model"),
+):
+    return FastJSONResponse(await run_io(rank_fleet_risk, k, city=city, model=model))
+
+
+# ============================================================
+# ROLLUPS (pre-aggregated series for dashboards / trends)
+# ============================================================
+
+@app.get("/rollups")
+async def rollups(
+    vehicle_id: str = Query(..., description="Vehicle ID"),
+    start: Optional[str] = Query(None, description="Window start (ISO-8601)"),
+    end: Optional[str] = Query(None, description="Window end (ISO-8601)"),
+    signals: Optional[str] = Query(None, description="Comma-separated signals (default: all)"),
+    resolution: Optional[str] = Query(None, description="1m, 1h or 1d (default: coarsest that fits the window)"),
+):
+    try:
+        result = await run_io(
+            get_rollups().query,
+            vehicle_id.strip(),
+            parse_window_bound(start),
+            parse_window_bound(end),
+            [s.strip() for s in signals.split(",") if s.strip()] if signals else None,
+            resolution,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return FastJSONResponse(result)
 
 
 # ============================================================
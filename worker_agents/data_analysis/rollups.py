@@ -0,0 +1,379 @@
+# worker_agents/data_analysis/rollups.py
+#
+# Per-vehicle telematics rollups at 1-minute, 1-hour and 1-day resolution.
+#
+# Every reading stored in the telematics store is folded into one bucket
+# per tier (count / sum / min / max per signal), so a query reads at most a
+# bounded number of pre-aggregated buckets instead of raw readings. Each
+# tier keeps its own retention (ROLLUP_RETENTION_1M / _1H / _1D, in
+# buckets); older buckets are dropped as newer ones arrive.
+#
+# Buckets are mergeable, so late / out-of-order readings simply land in
+# their (older) bucket while it is still retained.
+#
+# Each tier is a NumPy ring that starts empty and doubles on demand up to
+# its retention, so a vehicle's memory follows the time span its readings
+# cover instead of being allocated in full on its first reading. Counts
+# and sums are float64 (means stay exact over busy buckets); min / max are
+# float32.
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from shared.records import TelematicsReading, parse_timestamp
+from shared.telematics_store import get_telematics_store
+
+
+ROLLUP_SIGNALS = (
+    "engine_temp_c",
+    "coolant_temp_c",
+    "intake_air_temp_c",
+    "oil_pressure_psi",
+    "battery_health_pct",
+    "brake_pad_wear_pct",
+    "rpm",
+    "vehicle_speed_kmph",
+    "fuel_efficiency_kmpl",
+)
+
+# name -> (bucket width in seconds, buckets retained per vehicle)
+TIERS = {
+    "1m": (60, int(os.getenv("ROLLUP_RETENTION_1M", str(24 * 60)))),       # 1 day
+    "1h": (3600, int(os.getenv("ROLLUP_RETENTION_1H", str(90 * 24)))),     # 90 days
+    "1d": (86400, int(os.getenv("ROLLUP_RETENTION_1D", str(2 * 365)))),    # 2 years
+}
+
+# Automatic resolution: the coarsest tier giving at least this many buckets
+ROLLUP_TARGET_POINTS = int(os.getenv("ROLLUP_TARGET_POINTS", "60"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Aggregate slots per signal
+_COUNT, _SUM, _MIN, _MAX = range(4)
+
+# count / sum accumulate in float64; min / max only need float32
+_TOTALS_DTYPE = np.float64
+_EXTREMES_DTYPE = np.float32
+
+
+def _seconds(ts: datetime) -> int:
+    return int((parse_timestamp(ts) - _EPOCH).total_seconds())
+
+
+def _as_datetime(seconds: int) -> datetime:
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+def _number(v) -> float:
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        return np.nan
+    return float(v)
+
+
+def _empty_totals(shape) -> np.ndarray:
+    return np.zeros(shape + (2,), dtype=_TOTALS_DTYPE)
+
+
+def _empty_extremes(shape) -> np.ndarray:
+    ext = np.empty(shape + (2,), dtype=_EXTREMES_DTYPE)
+    ext[..., 0] = np.inf
+    ext[..., 1] = -np.inf
+    return ext
+
+
+class _Tier:
+    """
+    Buckets of one vehicle at one resolution as a ring: keys[slot] is the
+    bucket start (epoch seconds, -1 = empty), totals[slot] its (signals x
+    count/sum) and extremes[slot] its (signals x min/max). A bucket's slot
+    is (start // width) % capacity. The ring starts empty and doubles when
+    two retained buckets would share a slot; at capacity == retention they
+    never do, and a new bucket simply overwrites the expired one.
+    """
+
+    __slots__ = ("width", "retention", "n_signals", "keys", "totals", "extremes",
+                 "newest", "trimmed")
+
+    def __init__(self, width: int, retention: int, n_signals: int):
+        self.width = width
+        self.retention = retention
+        self.n_signals = n_signals
+        self.keys = np.empty(0, dtype=np.int64)
+        self.totals = _empty_totals((0, n_signals))
+        self.extremes = _empty_extremes((0, n_signals))
+        self.newest: Optional[int] = None
+        self.trimmed = False    # True once any bucket has been dropped
+
+    def _floor(self) -> int:
+        """Bucket starts at or below this are outside the retained range."""
+        return self.newest - self.width * self.retention
+
+    def _live(self) -> np.ndarray:
+        return (self.keys != -1) & (self.keys > self._floor())
+
+    def _grow(self, key: int):
+        """Re-slot the retained buckets into the smallest larger ring where key fits."""
+        live = self._live()
+        if (self.keys[~live] != -1).any():
+            self.trimmed = True
+        keys = np.append(self.keys[live], key) // self.width
+
+        capacity = len(self.keys)
+        while True:
+            capacity = min(self.retention, max(1, 2 * capacity))
+            if capacity == self.retention or len(np.unique(keys % capacity)) == len(keys):
+                break
+
+        slots = (self.keys[live] // self.width) % capacity
+        grown = np.full(capacity, -1, dtype=np.int64)
+        grown[slots] = self.keys[live]
+        totals = _empty_totals((capacity, self.n_signals))
+        totals[slots] = self.totals[live]
+        extremes = _empty_extremes((capacity, self.n_signals))
+        extremes[slots] = self.extremes[live]
+        self.keys, self.totals, self.extremes = grown, totals, extremes
+
+    def _slot(self, key: int) -> int:
+        while True:
+            if len(self.keys):
+                slot = (key // self.width) % len(self.keys)
+                held = self.keys[slot]
+                if held == key:
+                    return slot
+                if held == -1 or held <= self._floor():
+                    # Empty, or whatever held this slot has expired
+                    if held != -1:
+                        self.trimmed = True
+                    self.keys[slot] = key
+                    self.totals[slot] = 0
+                    self.extremes[slot, :, 0] = np.inf
+                    self.extremes[slot, :, 1] = -np.inf
+                    return slot
+            self._grow(key)
+
+    def add(self, t: int, values: np.ndarray, present: np.ndarray) -> bool:
+        key = t - t % self.width
+        if self.newest is not None and key <= self._floor():
+            self.trimmed = True
+            return False    # older than the retained range
+
+        if self.newest is None or key > self.newest:
+            self.newest = key
+        slot = self._slot(key)
+
+        totals, extremes = self.totals[slot], self.extremes[slot]
+        totals[present, 0] += 1
+        totals[present, 1] += values[present]
+        np.minimum(extremes[:, 0], values, out=extremes[:, 0], where=present, casting="same_kind")
+        np.maximum(extremes[:, 1], values, out=extremes[:, 1], where=present, casting="same_kind")
+        return True
+
+    def _slots(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Retained slots with start <= bucket start <= end, oldest first."""
+        if self.newest is None:
+            return np.empty(0, dtype=np.int64)
+        mask = self._live()
+        if start is not None:
+            mask &= self.keys >= start - start % self.width
+        if end is not None:
+            mask &= self.keys <= end
+        slots = np.flatnonzero(mask)
+        return slots[np.argsort(self.keys[slots], kind="stable")]
+
+    def oldest(self) -> Optional[int]:
+        slots = self._slots()
+        return int(self.keys[slots[0]]) if len(slots) else None
+
+    def covers(self, t: int) -> bool:
+        """Whether every reading at or after t is still represented."""
+        if not self.trimmed:
+            return True
+        oldest = self.oldest()
+        return oldest is not None and oldest <= t - t % self.width
+
+    def range(self, start: Optional[int], end: Optional[int]):
+        """(bucket starts, signals x count/sum/min/max float64 aggregates) for the window, oldest first."""
+        slots = self._slots(start, end)
+        agg = np.concatenate([self.totals[slots], self.extremes[slots].astype(np.float64)], axis=2)
+        return self.keys[slots].tolist(), agg
+
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.totals.nbytes + self.extremes.nbytes
+
+    def __len__(self):
+        return len(self._slots())
+
+
+class TelematicsRollups:
+    """
+    Incrementally maintained min / max / mean / count per vehicle, signal
+    and tier. Fed by the telematics store (subscribe), queried by the
+    data_analysis /rollups endpoint and trend features.
+    """
+
+    def __init__(self, signals: Sequence[str] = ROLLUP_SIGNALS, tiers: Dict[str, tuple] = None):
+        self.signals = tuple(signals)
+        self.tiers = dict(tiers or TIERS)
+        self._lock = threading.Lock()
+        self._vehicles: Dict[str, Dict[str, _Tier]] = {}
+
+    # ---- writes ----
+    def add(self, rec: TelematicsReading) -> bool:
+        if rec.timestamp is None:
+            return False
+        t = _seconds(rec.timestamp)
+        values = np.array([_number(getattr(rec, s, None)) for s in self.signals], dtype=np.float64)
+        present = ~np.isnan(values)
+
+        with self._lock:
+            tiers = self._vehicles.get(rec.vehicle_id)
+            if tiers is None:
+                tiers = self._vehicles[rec.vehicle_id] = {
+                    name: _Tier(width, retention, len(self.signals))
+                    for name, (width, retention) in self.tiers.items()
+                }
+            added = False
+            for tier in tiers.values():
+                added |= tier.add(t, values, present)
+        return added
+
+    # ---- reads ----
+    def choose_resolution(self, vehicle_id: str,
+                          start: Optional[datetime], end: Optional[datetime],
+                          target_points: int = ROLLUP_TARGET_POINTS) -> str:
+        """
+        Coarsest tier that still splits the window into at least
+        target_points buckets and whose retention reaches back to start.
+        An open-ended window is sized from the data the vehicle has.
+        """
+        with self._lock:
+            tiers = self._vehicles.get(vehicle_id)
+            by_width = sorted(self.tiers, key=lambda n: self.tiers[n][0])
+            if not tiers:
+                return by_width[0]
+
+            t_start = _seconds(start) if start else None
+            t_end = _seconds(end) if end else None
+            if t_start is None or t_end is None:
+                newest = max(t.newest + t.width for t in tiers.values())
+                oldest = min(t.oldest() for t in tiers.values())
+                t_start = oldest if t_start is None else t_start
+                t_end = newest if t_end is None else t_end
+
+            window = max(0, t_end - t_start)
+
+            # Tiers that have already dropped part of the window are skipped
+            covering = [n for n in by_width if tiers[n].covers(t_start)]
+            first_ok = by_width.index(covering[0]) if covering else len(by_width) - 1
+
+            chosen = by_width[first_ok]
+            for name in by_width[first_ok:]:
+                if window // self.tiers[name][0] >= target_points:
+                    chosen = name
+            return chosen
+
+    def query(self, vehicle_id: str,
+              start: Optional[datetime] = None,
+              end: Optional[datetime] = None,
+              signals: Optional[Sequence[str]] = None,
+              resolution: Optional[str] = None,
+              target_points: int = ROLLUP_TARGET_POINTS) -> Dict[str, Any]:
+        """
+        Columnar series of buckets with start <= bucket_start <= end, plus
+        a whole-window aggregate per signal.
+        """
+        if resolution is not None and resolution not in self.tiers:
+            raise ValueError(f"resolution must be one of {list(self.tiers)}")
+        signals = list(signals or self.signals)
+        unknown = [s for s in signals if s not in self.signals]
+        if unknown:
+            raise ValueError(f"Unknown signals {unknown}; rolled up: {list(self.signals)}")
+
+        if resolution is None:
+            resolution = self.choose_resolution(vehicle_id, start, end, target_points)
+        cols = [self.signals.index(s) for s in signals]
+
+        with self._lock:
+            tier = self._vehicles.get(vehicle_id, {}).get(resolution)
+            if tier is None:
+                keys, agg = [], np.zeros((0, len(self.signals), 4))
+            else:
+                keys, agg = tier.range(_seconds(start) if start else None,
+                                       _seconds(end) if end else None)
+        agg = agg[:, cols, :]
+
+        def values(col, has):
+            return [round(v, 4) if h else None for v, h in zip(col.tolist(), has.tolist())]
+
+        series = {}
+        window = {}
+        for j, s in enumerate(signals):
+            counts, sums = agg[:, j, _COUNT], agg[:, j, _SUM]
+            has = counts > 0
+            series[s] = {
+                "count": counts.astype(np.int64).tolist(),
+                "min": values(agg[:, j, _MIN], has),
+                "max": values(agg[:, j, _MAX], has),
+                "mean": values(np.divide(sums, counts, out=np.zeros_like(sums), where=has), has),
+            }
+            count = int(counts.sum())
+            window[s] = {
+                "count": count,
+                "min": round(float(agg[has, j, _MIN].min()), 4) if count else None,
+                "max": round(float(agg[has, j, _MAX].max()), 4) if count else None,
+                "mean": round(float(sums.sum()) / count, 4) if count else None,
+            }
+
+        return {
+            "vehicle_id": vehicle_id,
+            "resolution": resolution,
+            "bucket_seconds": self.tiers[resolution][0],
+            "start": start,
+            "end": end,
+            "buckets": [_as_datetime(k) for k in keys],
+            "series": series,
+            "window": window,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "vehicles": len(self._vehicles),
+                "buckets": {
+                    name: sum(len(t[name]) for t in self._vehicles.values())
+                    for name in self.tiers
+                },
+                "bytes": sum(t.nbytes() for tiers in self._vehicles.values() for t in tiers.values()),
+            }
+
+
+def parse_window_bound(value: Optional[str]) -> Optional[datetime]:
+    """ISO-8601 query bound; None for empty, ValueError if unparseable."""
+    if not value:
+        return None
+    ts = parse_timestamp(value)
+    if ts is None:
+        raise ValueError(f"Invalid timestamp {value!r}; expected ISO-8601")
+    return ts
+
+
+_rollups = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups() -> TelematicsRollups:
+    """Singleton, subscribed to the telematics store (buffered readings are replayed)."""
+    global _rollups
+
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                rollups = TelematicsRollups()
+                get_telematics_store().subscribe(rollups.add, replay=True)
+                _rollups = rollups
+
+    return _rollups
@@ -10,17 +10,11 @@ from datetime import datetime
 
 
 # ============================================================
-# JSON SANITIZER — Ensures datetime is serializable
+# DATETIMES — loader dicts are flat; only their datetimes need converting
 # ============================================================
 
-def clean_json(obj):
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    if isinstance(obj, dict):
-        return {k: clean_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [clean_json(i) for i in obj]
-    return obj
+def iso_datetimes(record):
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in record.items()}
 
 
 # ============================================================
@@ -72,7 +66,7 @@ def get_vehicle_profile(vehicle_id: str):
         return {
             "exists": True,
             "vehicle_id": vehicle_id,
-            "profile": clean_json(profile)
+            "profile": iso_datetimes(profile)
         }
 
     except Exception as e:
@@ -141,7 +135,7 @@ def get_historical_usage(vehicle_id: str):
             if h.get("date") and isinstance(h["date"], datetime):
                 summary["last_service_date"] = h["date"].isoformat()
 
-        return clean_json(summary)
+        return summary
 
     except Exception as e:
         return {
@@ -184,7 +178,7 @@ def get_telematics_snapshot(vehicle_id: str):
             }
 
         telematics["exists"] = True
-        return clean_json(telematics)
+        return iso_datetimes(telematics)
 
     except Exception as e:
         return {
@@ -1,58 +1,265 @@
 # worker_agents/diagnosis_agent/agent_logic.py
 
+import itertools
+import os
+import threading
+
+from shared.executors import get_executor, run_in, run_io
+from shared.records import ENGINE_TEMP_STATUS_CUTS, engine_temp_status
 from shared.shared_loader import (
+    aload_vehicle_bundle,
     load_vehicle_profile,
+    load_vehicle_profiles_bulk,
     load_telematics,
+    load_telematics_bulk,
     load_maintenance_history,
+    load_maintenance_history_bulk,
+)
+from shared.telematics_store import get_telematics_store
+
+from shared.dtc_index import get_dtc_index, normalize_dtc_codes
+from shared.query_cache import LRUCache
+from shared.rule_engine import get_rule_set
+from shared.retrieval import capa_library_version, get_retriever
+from shared.vectorstore import (
+    CACHE_SIZE,
+    CACHE_TTL,
+    cache_stats as embedding_cache_stats,
+    on_rebuild,
+    similarity_search_among,
 )
 
-from shared.vectorstore import get_vectorstore
+# Top-k CAPA matches per normalized query; cleared when the vectorstore is rebuilt
+_capa_cache = LRUCache(CACHE_SIZE, CACHE_TTL, name="capa_results")
+on_rebuild(_capa_cache.clear)
+
+CAPA_TOP_K = 3
+
+# Precomputed top-k for every reachable (status, alerts, dtcs) key; see precompute_capa_table
+_capa_table = {}
+_table_lock = threading.Lock()
+
+_library_version = None
+
+
+def _sync_capa_library():
+    """
+    Drop every CAPA-derived cache when capa_rca_library.json has changed.
+    The vectorstore's on_rebuild covers dense / hybrid mode; lexical mode
+    never rebuilds it, so the library version is checked directly too.
+    """
+    global _library_version
+
+    version = capa_library_version()
+    if version == _library_version:
+        return
+    first = _library_version is None
+    _library_version = version
+    if not first:
+        _capa_cache.clear()
+        _refresh_capa_table()
 
 
 # ---------- RULE-BASED DIAGNOSTICS ----------
 def rule_based_signals(tele):
-    alerts = []
+    """Threshold alerts for one reading (rule set "diagnosis" in shared/rules.json)."""
+    return get_rule_set("diagnosis").evaluate(tele)
 
-    if tele.get("engine_temp_c", 0) > 95:
-        alerts.append({
-            "component": "engine",
-            "issue": "overheating",
-            "severity": "high"
-        })
 
-    if tele.get("brake_pad_wear_pct", 100) < 15:
-        alerts.append({
-            "component": "brakes",
-            "issue": "pad_wear_low",
-            "severity": "medium"
-        })
+def rule_based_signals_many(teles):
+    """rule_based_signals for many readings in one vectorized pass."""
+    return get_rule_set("diagnosis").evaluate_many(teles)
 
-    if tele.get("battery_health_pct", 100) < 40:
-        alerts.append({
-            "component": "battery",
-            "issue": "weak_battery",
-            "severity": "medium"
-        })
 
-    return alerts
+# ---------- RETRIEVAL FROM CAPA / RCA VECTORSTORE ----------
+def capa_query_key(tele, rule_alerts):
+    """
+    Discrete inputs the CAPA query is built from. Raw brake/battery
+    readings are already reflected in the rule alerts.
+    """
+    dtc_codes = normalize_dtc_codes(tele.get("dtc_code_list"))
+    alerts = tuple((a["component"], a["issue"]) for a in rule_alerts)
+    return (tele.get("engine_temp_status"), alerts, dtc_codes)
 
 
-# ---------- RETRIEVAL FROM CAPA / RCA VECTORSTORE ----------
-def capa_similarity(tele, rule_alerts):
-    rule_summary = " ".join([f"{a['component']} {a['issue']}" for a in rule_alerts])
+def build_capa_query(key):
+    engine_temp_status, alerts, dtc_codes = key
+    rule_summary = " ".join(f"{component} {issue}" for component, issue in alerts)
+
+    return (
+        "Vehicle Condition:\n"
+        f"- Engine Temp Status: {engine_temp_status}\n"
+        f"- Rule Alerts: {rule_summary}\n"
+        f"- DTC Codes: {list(dtc_codes)}"
+    )
+
+
+def dtc_capa_matches(key, k=3):
+    """
+    DTC fast path. CAPA entries whose related_dtc_codes match the query's
+    DTCs are returned directly when there are at most k of them; otherwise
+    the search is restricted to that candidate set (dense, or BM25 in
+    lexical mode so no embedding model is loaded).
+    Returns None when the query has no DTC with a known CAPA entry.
+    """
+    index = get_dtc_index()
+    candidates = index.candidates(key[2])
+    if not candidates:
+        return None
+
+    if len(candidates) <= k:
+        return tuple(index.documents[i].page_content for i in candidates)
+
+    retriever = get_retriever()
+    if retriever.uses_dense:
+        docs = similarity_search_among(build_capa_query(key), candidates, k=k)
+    else:
+        docs = retriever.lexical_among(build_capa_query(key), candidates, k=k)
+    return tuple(d.page_content for d in docs)
+
+
+def capa_similarity(tele, rule_alerts, k=CAPA_TOP_K):
+    hit = cached_capa_matches(tele, rule_alerts, k)
+    if hit is not None:
+        return hit
+    return search_capa_matches(tele, rule_alerts, k)
+
+
+def cached_capa_matches(tele, rule_alerts, k=CAPA_TOP_K):
+    """Matches from the precomputed table or result cache; None if a search is needed."""
+    _sync_capa_library()
+    hit = _cached_capa(capa_query_key(tele, rule_alerts) + (k,))
+    return None if hit is None else list(hit)
+
+
+def _cached_capa(key):
+    hit = _capa_table.get(key)
+    if hit is None:
+        hit = _capa_cache.get(key)
+    return hit
+
+
+def search_capa_matches(tele, rule_alerts, k=CAPA_TOP_K):
+    """Live search (DTC fast path, then the retriever); result is cached."""
+    key = capa_query_key(tele, rule_alerts) + (k,)
+
+    matches = dtc_capa_matches(key[:3], k)
+    if matches is None:
+        docs = get_retriever().search(build_capa_query(key[:3]), k=k)
+        matches = tuple(d.page_content for d in docs)
+
+    _capa_cache.set(key, matches)
+    return list(matches)
+
+
+def _resolve_capa_keys(keys, use_cache=True):
+    """Top-k CAPA contents per (status, alerts, dtcs, k) key, in key order."""
+    if use_cache:
+        _sync_capa_library()
+    results = {}
+    pending = []
+
+    for key in keys:
+        if key in results:
+            continue
+        hit = _cached_capa(key) if use_cache else None
+        if hit is None:
+            hit = dtc_capa_matches(key[:3], key[3])
+            if hit is None:
+                pending.append(key)
+            elif use_cache:
+                _capa_cache.set(key, hit)
+        results[key] = hit
+
+    for k in {key[3] for key in pending}:
+        group = [key for key in pending if key[3] == k]
+        batches = get_retriever().search_many([build_capa_query(key[:3]) for key in group], k=k)
+        for key, docs in zip(group, batches):
+            results[key] = tuple(d.page_content for d in docs)
+            if use_cache:
+                _capa_cache.set(key, results[key])
+
+    return [results[key] for key in keys]
+
+
+# ---------- PRECOMPUTED CAPA TABLE ----------
+# Probe readings at and on either side of every diagnosis rule threshold
+# (from the live rule config) and engine_temp_status cut point. Running the
+# real rules over them yields every reachable (status, alerts) pair.
+_PROBE_EPSILON = 1e-3
+
+
+def _probe_values(rules):
+    """signal -> probe values (None = signal missing)."""
+    points = {}
+    for rule in rules:
+        points.setdefault(rule["signal"], set()).add(float(rule["threshold"]))
+    points.setdefault("engine_temp_c", set()).update(float(c) for c in ENGINE_TEMP_STATUS_CUTS)
+
+    return {
+        signal: [None] + sorted({v + d for v in cuts for d in (-_PROBE_EPSILON, 0.0, _PROBE_EPSILON)})
+        for signal, cuts in points.items()
+    }
+
+
+def reachable_rule_states():
+    probes = _probe_values(get_rule_set("diagnosis").rules)
+    signals = list(probes)
 
-    query = f"""
-    Vehicle Condition:
-    - Engine Temp Status: {tele.get('engine_temp_status')}
-    - Brake Pad Wear: {tele.get('brake_pad_wear_pct')}
-    - Battery Health: {tele.get('battery_health_pct')}
-    - Rule Alerts: {rule_summary}
-    - DTC Codes: {tele.get('dtc_code_list')}
+    states = set()
+    for values in itertools.product(*(probes[s] for s in signals)):
+        tele = {s: v for s, v in zip(signals, values) if v is not None}
+        if "engine_temp_c" in tele:
+            tele["engine_temp_status"] = engine_temp_status(tele["engine_temp_c"])
+        states.add(capa_query_key(tele, rule_based_signals(tele))[:2])
+    return sorted(states, key=repr)
+
+
+def observed_dtc_sets():
+    """Distinct normalized DTC sets in the latest fleet telematics, plus 'no DTC'."""
+    seen = {()}
+    for reading in get_telematics_store().latest_all().values():
+        seen.add(normalize_dtc_codes(reading.dtc_code_list))
+    return sorted(seen)
+
+
+def precompute_capa_table(k=CAPA_TOP_K):
     """
+    Run retrieval once for every reachable rule state x observed DTC set and
+    swap the results in as the lookup table. /diagnose then only searches
+    live for combinations not seen at precompute time.
+    """
+    global _capa_table
+
+    _sync_capa_library()
+    with _table_lock:
+        keys = [
+            state + (dtcs, k)
+            for state in reachable_rule_states()
+            for dtcs in observed_dtc_sets()
+        ]
+        _capa_table = dict(zip(keys, _resolve_capa_keys(keys, use_cache=False)))
+
+    print(f"✔ CAPA match table: {len(_capa_table)} combinations precomputed.")
+    return len(_capa_table)
 
-    vs = get_vectorstore()
-    docs = vs.similarity_search(query, k=3)
-    return [d.page_content for d in docs]
+
+def _refresh_capa_table():
+    # Only refresh a table that was already built (startup builds the first one)
+    if _capa_table:
+        _capa_table.clear()
+        threading.Thread(target=precompute_capa_table, daemon=True).start()
+
+
+on_rebuild(_refresh_capa_table)
+
+
+def capa_cache_stats():
+    return {
+        "capa_results": _capa_cache.stats(),
+        "query_embeddings": embedding_cache_stats(),
+        "capa_table_size": len(_capa_table),
+    }
 
 
 # ---------- MAIN DIAGNOSIS PIPELINE ----------
@@ -61,15 +268,104 @@ def diagnose_vehicle(vehicle_id: str):
     tele = load_telematics(vehicle_id)
     history = load_maintenance_history(vehicle_id)
 
+    missing, rule_alerts, trends = _diagnosis_precheck(vehicle_id, profile, tele)
+    if missing is not None:
+        return missing
+
+    capa_docs = cached_capa_matches(tele, rule_alerts)
+    from_cache = capa_docs is not None
+    if not from_cache:
+        capa_docs = search_capa_matches(tele, rule_alerts)
+    return {**_diagnosis_result(vehicle_id, tele, rule_alerts, trends, capa_docs), "from_cache": from_cache}
+
+
+async def diagnose_vehicle_async(vehicle_id: str):
+    """
+    diagnose_vehicle for async endpoints: loads and the precheck (which may
+    refresh the telematics feed or the CAPA library) on the io pool, cache
+    and table hits inline, and only a live CAPA search on the embedding pool.
+    """
+    profile, tele, history = await aload_vehicle_bundle(vehicle_id)
+
+    missing, rule_alerts, trends = await run_io(_diagnosis_precheck, vehicle_id, profile, tele)
+    if missing is not None:
+        return missing
+
+    # The precheck has synced the CAPA library; the lookup itself is a dict get
+    hit = _cached_capa(capa_query_key(tele, rule_alerts) + (CAPA_TOP_K,))
+    from_cache = hit is not None
+    capa_docs = list(hit) if from_cache else None
+    if not from_cache:
+        capa_docs = await run_in("embedding", search_capa_matches, tele, rule_alerts)
+    return {**_diagnosis_result(vehicle_id, tele, rule_alerts, trends, capa_docs), "from_cache": from_cache}
+
+
+def _diagnosis_precheck(vehicle_id, profile, tele):
+    """
+    (not-found response or None, rule_alerts, trend_predictions). Blocking:
+    trend_predictions may refresh the telematics store and the CAPA library
+    sync may rebuild the lexical index.
+    """
     if not profile.get("exists") or not tele.get("exists"):
         return {
             "vehicle_id": vehicle_id,
             "error": "Vehicle profile or telematics not found."
-        }
+        }, None, None
 
     rule_alerts = rule_based_signals(tele)
-    capa_docs = capa_similarity(tele, rule_alerts)
+    trends = trend_predictions(vehicle_id, rule_alerts)
+    _sync_capa_library()
+    return None, rule_alerts, trends
 
+
+# ---------- TREND-BASED PREDICTIONS ----------
+PREDICTION_HORIZON_DAYS = float(os.getenv("PREDICTION_HORIZON_DAYS", "30"))
+URGENT_TREND_DAYS = float(os.getenv("URGENT_TREND_DAYS", "7"))
+
+
+def trend_predictions(vehicle_id, rule_alerts):
+    """
+    Diagnosis rules not firing yet whose signal trend (streaming EW slope,
+    see shared/signal_stats.py) crosses the threshold within
+    PREDICTION_HORIZON_DAYS. Soonest first.
+    """
+    stats = get_telematics_store().signal_stats(vehicle_id)
+    if stats is None:
+        return []
+
+    firing = {(a["component"], a["issue"]) for a in rule_alerts}
+    predictions = []
+
+    for rule in get_rule_set("diagnosis").rules:
+        if (rule["component"], rule["type"]) in firing:
+            continue
+        signal = stats.signals.get(rule["signal"])
+        if signal is None:
+            continue
+        days = signal.days_to_cross(rule["op"], rule["threshold"])
+        if days is None or days > PREDICTION_HORIZON_DAYS:
+            continue
+
+        predictions.append({
+            "component": rule["component"],
+            "issue": rule["type"],
+            "severity": rule["severity"],
+            "signal": rule["signal"],
+            "threshold": rule["threshold"],
+            "current": round(signal.level, 2),
+            "slope_per_day": round(signal.slope_per_day, 4),
+            "days_to_threshold": round(days, 1),
+            "message": (
+                f"{rule['signal']} expected to reach {rule['threshold']} "
+                f"in about {max(1, round(days))} days"
+            ),
+        })
+
+    predictions.sort(key=lambda p: p["days_to_threshold"])
+    return predictions
+
+
+def _diagnosis_result(vehicle_id, tele, rule_alerts, trends, capa_docs):
     # -------------------------------------------------------
     # ⭐ Compute most-likely predicted failure for CustomerAgent
     # -------------------------------------------------------
@@ -80,6 +376,15 @@ def diagnose_vehicle(vehicle_id: str):
             "urgency": top_alert["severity"],
             "component": top_alert["component"]
         }
+    elif trends:
+        # no threshold crossed yet, but one is coming: earliest crossing
+        soonest = trends[0]
+        predicted_failure = {
+            "predicted_failure": soonest["issue"],
+            "urgency": "medium" if soonest["days_to_threshold"] <= URGENT_TREND_DAYS else "low",
+            "component": soonest["component"],
+            "days_to_threshold": soonest["days_to_threshold"]
+        }
     else:
         # fallback: low-risk general report
         predicted_failure = {
@@ -94,6 +399,7 @@ def diagnose_vehicle(vehicle_id: str):
     diagnosis_text = (
         f"Vehicle {vehicle_id} shows {len(rule_alerts)} preliminary alerts.\n"
         f"Telemetry analysis: Engine temp status = {tele.get('engine_temp_status')}.\n"
+        f"Trend outlook: {'; '.join(p['message'] for p in trends) or 'no threshold crossings predicted'}.\n"
         f"Based on CAPA/RCA patterns, potential failure causes match: {capa_docs[:2]}.\n"
     )
 
@@ -104,6 +410,50 @@ def diagnose_vehicle(vehicle_id: str):
         "vehicle_id": vehicle_id,
         "rule_alerts": rule_alerts,
         "capa_matches": capa_docs,
+        "trend_predictions": trends,
         "predicted_failure": predicted_failure,   # ⭐ ADDED BLOCK
         "diagnosis_summary": diagnosis_text
     }
+
+
+# ---------- BATCH DIAGNOSIS ----------
+def diagnose_vehicles(vehicle_ids):
+    """
+    diagnose_vehicle for many vehicles: bulk loads, rules for every
+    vehicle, then one batched CAPA retrieval for all of them.
+    Results are in input order, each shaped like diagnose_vehicle's.
+    """
+    unique = list(dict.fromkeys(vehicle_ids))
+
+    # Profiles, telematics and history load concurrently on the io pool
+    io = get_executor("io")
+    profiles_f = io.submit(load_vehicle_profiles_bulk, unique)
+    tele_f = io.submit(load_telematics_bulk, unique)
+    history_f = io.submit(load_maintenance_history_bulk, unique)
+    profiles, teles = profiles_f.result(), tele_f.result()
+    history_f.result()
+
+    ready = [vid for vid in unique if profiles[vid].get("exists") and teles[vid].get("exists")]
+    rule_alerts = dict(zip(ready, rule_based_signals_many([teles[vid] for vid in ready])))
+
+    trends = {vid: trend_predictions(vid, rule_alerts[vid]) for vid in ready}
+
+    # from_cache: matches came from the precomputed table / result cache, no retrieval
+    _sync_capa_library()
+    keys = {vid: capa_query_key(teles[vid], rule_alerts[vid]) + (CAPA_TOP_K,) for vid in ready}
+    from_cache = {vid: _cached_capa(keys[vid]) is not None for vid in ready}
+    capa_docs = _resolve_capa_keys([keys[vid] for vid in ready])
+
+    results = {}
+    for vid, docs in zip(ready, capa_docs):
+        result = _diagnosis_result(vid, teles[vid], rule_alerts[vid], trends[vid], list(docs))
+        results[vid] = {**result, "from_cache": from_cache[vid]}
+
+    for vid in unique:
+        if vid not in results:
+            results[vid] = {
+                "vehicle_id": vid,
+                "error": "Vehicle profile or telematics not found."
+            }
+
+    return [results[vid] for vid in vehicle_ids]
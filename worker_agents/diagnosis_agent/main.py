@@ -1,15 +1,27 @@
 # worker_agents/diagnosis_agent/main.py
 
 import sys, os
-from fastapi import FastAPI
+from typing import List
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
 
 # Add project root to PYTHONPATH
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from shared.vectorstore import get_vectorstore
-from worker_agents.diagnosis_agent.agent_logic import diagnose_vehicle
+from shared.executors import executor_stats, install_busy_handler, run_in, shutdown_executors
+from shared.responses import FastJSONResponse
+from shared.retrieval import get_retriever
+from shared.vectorstore import get_vectorstore, sync_vectorstore
+from worker_agents.diagnosis_agent.agent_logic import (
+    capa_cache_stats,
+    diagnose_vehicle_async,
+    diagnose_vehicles,
+    precompute_capa_table,
+)
+
+# Upper bound on vehicle_ids per /diagnose/batch call
+MAX_BATCH_SIZE = int(os.getenv("DIAGNOSE_BATCH_MAX", "1000"))
 
 
 # -----------------------------
@@ -17,19 +29,25 @@ from worker_agents.diagnosis_agent.agent_logic import diagnose_vehicle
 # -----------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("⚡ [Startup] Preloading FAISS vectorstore...")
-    get_vectorstore()   # loads global vectorstore once
-    print("✔ Vectorstore ready.")
+    retriever = get_retriever()
+    if retriever.uses_dense:
+        print("⚡ [Startup] Preloading FAISS vectorstore...")
+        get_vectorstore()   # loads global vectorstore once
+        print("✔ Vectorstore ready.")
+    print(f"✔ CAPA retrieval mode: {retriever.mode}")
+    precompute_capa_table()
 
     yield  # ---- Application Runs Here ----
 
+    shutdown_executors()
     print("🛑 [Shutdown] DiagnosisAgent shutting down.")
 
 
 # -----------------------------
 # 🚀 FastAPI App Initialization
 # -----------------------------
-app = FastAPI(title="Diagnosis Agent", lifespan=lifespan)
+app = FastAPI(title="Diagnosis Agent", lifespan=lifespan, default_response_class=FastJSONResponse)
+install_busy_handler(app)
 
 
 # -----------------------------
@@ -39,9 +57,36 @@ class DiagnosisRequest(BaseModel):
     vehicle_id: str
 
 
+class BatchDiagnosisRequest(BaseModel):
+    vehicle_ids: List[str]
+
+
 # -----------------------------
 # API Endpoint
 # -----------------------------
 @app.post("/diagnose")
-def diagnose(req: DiagnosisRequest):
-    return diagnose_vehicle(req.vehicle_id)
+async def diagnose(req: DiagnosisRequest):
+    return FastJSONResponse(await diagnose_vehicle_async(req.vehicle_id))
+
+
+@app.post("/diagnose/batch")
+async def diagnose_batch(req: BatchDiagnosisRequest):
+    """Diagnose many vehicles in one call; results follow the order of vehicle_ids."""
+    if len(req.vehicle_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_SIZE} vehicle_ids per batch (got {len(req.vehicle_ids)})."
+        )
+    results = await run_in("embedding", diagnose_vehicles, req.vehicle_ids)
+    return FastJSONResponse({"count": len(results), "results": results})
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**capa_cache_stats(), "executors": executor_stats()}
+
+
+@app.post("/vectorstore/sync")
+async def vectorstore_sync():
+    """Apply capa_rca_library.json changes to the live index (no restart, no full re-embed)."""
+    return await run_in("embedding", sync_vectorstore)
@@ -6,6 +6,7 @@ from shared.shared_loader import (
     load_telematics,
     load_capa_rca_docs
 )
+from shared.vectorstore import search_many
 from .vectorstore_builder import get_vectorstore
 
 @tool("get_vehicle_profile")
@@ -42,3 +43,19 @@ def search_capa_rca_tool(query: str, top_k: int = 3):
             "metadata": doc.metadata
         })
     return results
+
+
+@tool("search_capa_rca_batch")
+def search_capa_rca_batch_tool(queries: list, top_k: int = 3):
+    """
+    Batched search_capa_rca: one embedding call and one FAISS search for
+    all queries. Returns one result list per query, in order.
+    """
+    vs = get_vectorstore()
+    if vs is None:
+        return [[] for _ in queries]
+
+    return [
+        [{"content": doc.page_content, "metadata": doc.metadata} for doc in hits]
+        for hits in search_many(queries, k=top_k, vectorstore=vs)
+    ]
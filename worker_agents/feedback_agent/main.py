@@ -1,13 +1,16 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
+from shared.executors import install_busy_handler, run_io
+from shared.responses import FastJSONResponse
 from .agent_logic import analyze_feedback
 
-app = FastAPI(title="Feedback Agent", version="1.0.0")
+app = FastAPI(title="Feedback Agent", version="1.0.0", default_response_class=FastJSONResponse)
+install_busy_handler(app)
 
 class FeedbackRequest(BaseModel):
     vehicle_id: str
     feedback_text: str
 
 @app.post("/feedback")
-def feedback(req: FeedbackRequest):
-    return analyze_feedback(req.vehicle_id, req.feedback_text)
+async def feedback(req: FeedbackRequest):
+    return FastJSONResponse(await run_io(analyze_feedback, req.vehicle_id, req.feedback_text))
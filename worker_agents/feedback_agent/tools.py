@@ -1,5 +1,6 @@
 import os, json
 from langchain.tools import tool
+from shared import sqlite_store
 from shared.shared_loader import load_vehicle_profile
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,6 +16,9 @@ def get_vehicle_profile_tool(vehicle_id: str):
 @tool("get_past_feedback")
 def get_past_feedback_tool(vehicle_id: str):
     """Returns past stored feedback (offline JSON)."""
+    if sqlite_store.use_sqlite():
+        return sqlite_store.get_past_feedback(vehicle_id)
+
     if not os.path.exists(PAST_FEEDBACK_FILE):
         return {}
 
@@ -30,10 +34,14 @@ def get_past_feedback_tool(vehicle_id: str):
 @tool("store_feedback")
 def store_feedback_tool(data: str):
     """Stores processed feedback into disk."""
-    os.makedirs(os.path.dirname(PAST_FEEDBACK_FILE), exist_ok=True)
-
     new = json.loads(data)
 
+    if sqlite_store.use_sqlite():
+        sqlite_store.store_feedback(new)
+        return {"status": "saved"}
+
+    os.makedirs(os.path.dirname(PAST_FEEDBACK_FILE), exist_ok=True)
+
     # Load old data
     try:
         if os.path.exists(PAST_FEEDBACK_FILE):
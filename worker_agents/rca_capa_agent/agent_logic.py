@@ -1,44 +1,29 @@
 # agent_logic.py
 
 import json
+from shared.retrieval import get_retriever
 from .tools import (
     get_vehicle_profile_tool,
     get_maintenance_history_tool,
-    load_capa_rca_docs,
 )
 from .rules import map_issue_to_root_cause, climate_factor
 
 
-def keyword_match_score(text: str, query: str) -> int:
-    """Simple offline scoring based on keyword overlap."""
-    text_l = text.lower()
-    score = 0
-    for word in query.lower().split():
-        if word in text_l:
-            score += 1
-    return score
-
-
 def search_capa_patterns(query: str):
     """
-    Offline keyword-based CAPA/RCA search.
-    Looks inside local JSON docs.
+    Offline CAPA/RCA search.
+    BM25 over the shared CAPA library (lexical only - no embedding model).
     """
-    docs = load_capa_rca_docs()
-    results = []
-
-    for d in docs:
-        text = d.get("content", "")
-        score = keyword_match_score(text, query)
-        if score > 0:
-            results.append({
-                "score": score,
-                "content": text,
-                "metadata": d.get("metadata", {})
-            })
-
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:3]
+    hits = get_retriever().search_with_scores(query, k=3, mode="lexical")
+
+    return [
+        {
+            "score": round(score, 4),
+            "content": d.page_content,
+            "metadata": d.metadata
+        }
+        for d, score in hits
+    ]
 
 
 def generate_manufacturing_insights(vehicle_id: str,
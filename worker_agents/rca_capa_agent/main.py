@@ -2,13 +2,17 @@
 
 from fastapi import FastAPI
 from pydantic import BaseModel
+from shared.executors import install_busy_handler, run_io
+from shared.responses import FastJSONResponse
 from .agent_logic import generate_manufacturing_insights
 
 app = FastAPI(
     title="RCA/CAPA Agent",
     version="1.0.0",
-    description="Offline RCA agent without external dependencies"
+    description="Offline RCA agent without external dependencies",
+    default_response_class=FastJSONResponse,
 )
+install_busy_handler(app)
 
 
 class RCARequest(BaseModel):
@@ -18,9 +22,11 @@ class RCARequest(BaseModel):
 
 
 @app.post("/rca")
-def rca(req: RCARequest):
-    return generate_manufacturing_insights(
+async def rca(req: RCARequest):
+    insights = await run_io(
+        generate_manufacturing_insights,
         req.vehicle_id,
         req.service_event,
         req.feedback_analysis
     )
+    return FastJSONResponse(insights)
@@ -1,8 +1,11 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
+from shared.executors import install_busy_handler, run_in
+from shared.responses import FastJSONResponse
 from .agent_logic import schedule_appointment
 
-app = FastAPI(title="Scheduling Agent", version="1.0.0")
+app = FastAPI(title="Scheduling Agent", version="1.0.0", default_response_class=FastJSONResponse)
+install_busy_handler(app)
 
 class ScheduleRequest(BaseModel):
     vehicle_id: str
@@ -10,9 +13,13 @@ class ScheduleRequest(BaseModel):
     customer_preference: dict | None = None
 
 @app.post("/schedule")
-def schedule(req: ScheduleRequest):
-    return schedule_appointment(
+async def schedule(req: ScheduleRequest):
+    # flan-t5 generation: bounded "llm" pool (EXECUTOR_LLM_WORKERS)
+    result = await run_in(
+        "llm",
+        schedule_appointment,
         req.vehicle_id,
         req.diagnosis,
         req.customer_preference
     )
+    return FastJSONResponse(result)
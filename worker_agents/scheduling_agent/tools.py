@@ -1,5 +1,6 @@
 import json
 import os
+from shared import sqlite_store
 from shared.shared_loader import load_vehicle_profile as _load_vehicle_profile
 
 SLOTS_FILE = "../data/service_center_slots.json"
@@ -12,6 +13,9 @@ def load_vehicle_profile(vehicle_id: str):
 
 def load_service_center_slots(city: str):
     """Load service center slots from local JSON file."""
+    if sqlite_store.use_sqlite():
+        return sqlite_store.load_service_centers(location_contains=city)
+
     if not os.path.exists(SLOTS_FILE):
         return {}
 
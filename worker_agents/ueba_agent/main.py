@@ -2,10 +2,13 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Any, Dict
+from shared.executors import ExecutorBusy, install_busy_handler, run_in, run_io
+from shared.responses import FastJSONResponse
 from .tools import append_activity_log, read_activity_logs, read_alerts
 from .agent_logic import scan_and_detect
 
-app = FastAPI(title="UEBA Agent", version="1.0.0")
+app = FastAPI(title="UEBA Agent", version="1.0.0", default_response_class=FastJSONResponse)
+install_busy_handler(app)
 
 
 class ActivityRecord(BaseModel):
@@ -22,7 +25,7 @@ class ActivityRecord(BaseModel):
 
 
 @app.post("/ingest")
-def ingest(record: ActivityRecord):
+async def ingest(record: ActivityRecord):
     """
     Ingest a new activity log entry.
     Uses .model_dump() instead of deprecated .dict()
@@ -32,7 +35,9 @@ def ingest(record: ActivityRecord):
     rec = record.model_dump()
 
     try:
-        append_activity_log(rec)
+        await run_io(append_activity_log, rec)
+    except ExecutorBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -40,29 +45,32 @@ def ingest(record: ActivityRecord):
 
 
 @app.post("/scan")
-def run_scan(window_minutes: int = 15):
+async def run_scan(window_minutes: int = 15):
     """
     Scan recent logs for anomalies.
     """
     try:
-        alerts = scan_and_detect(window_minutes=window_minutes)
+        # IsolationForest fitting: bounded "ml" pool (EXECUTOR_ML_WORKERS)
+        alerts = await run_in("ml", scan_and_detect, window_minutes=window_minutes)
+    except ExecutorBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return {"alerts_count": len(alerts), "alerts": alerts}
+    return FastJSONResponse({"alerts_count": len(alerts), "alerts": alerts})
 
 
 @app.get("/alerts")
-def get_alerts():
+async def get_alerts():
     """
     Return all UEBA alerts.
     """
-    return read_alerts()
+    return FastJSONResponse(await run_io(read_alerts))
 
 
 @app.get("/logs")
-def get_logs():
+async def get_logs():
     """
     Return full agent activity logs.
     """
-    return read_activity_logs()
+    return FastJSONResponse(await run_io(read_activity_logs))
@@ -4,6 +4,8 @@ import os
 from datetime import datetime
 from typing import List, Dict, Any
 
+from shared import sqlite_store
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "..", "..", "data")
 
@@ -17,6 +19,9 @@ def _ensure_file(path: str, default):
             json.dump(default, f, indent=2)
 
 def append_activity_log(record: Dict[str, Any]):
+    if sqlite_store.use_sqlite():
+        return {"status": "ok", "count": sqlite_store.append_activity_log(record)}
+
     _ensure_file(LOG_PATH, [])
     with open(LOG_PATH, "r+", encoding="utf-8") as f:
         try:
@@ -30,6 +35,9 @@ def append_activity_log(record: Dict[str, Any]):
     return {"status": "ok", "count": len(data)}
 
 def read_activity_logs() -> List[Dict[str, Any]]:
+    if sqlite_store.use_sqlite():
+        return sqlite_store.read_activity_logs()
+
     _ensure_file(LOG_PATH, [])
     with open(LOG_PATH, "r", encoding="utf-8") as f:
         try:
@@ -38,6 +46,9 @@ def read_activity_logs() -> List[Dict[str, Any]]:
             return []
 
 def append_alert(alert: Dict[str, Any]):
+    if sqlite_store.use_sqlite():
+        return {"status": "alert_stored", "count": sqlite_store.append_alert(alert)}
+
     _ensure_file(ALERT_PATH, [])
     with open(ALERT_PATH, "r+", encoding="utf-8") as f:
         try:
@@ -51,6 +62,9 @@ def append_alert(alert: Dict[str, Any]):
     return {"status": "alert_stored", "count": len(data)}
 
 def read_alerts() -> List[Dict[str, Any]]:
+    if sqlite_store.use_sqlite():
+        return sqlite_store.read_alerts()
+
     _ensure_file(ALERT_PATH, [])
     with open(ALERT_PATH, "r", encoding="utf-8") as f:
         try: